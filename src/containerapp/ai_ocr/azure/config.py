@@ -6,16 +6,28 @@ from dotenv import load_dotenv
 
 logger = logging.getLogger(__name__)
 
+# Module-level credential shared by all Azure SDK clients (reused across calls)
+_credential = None
+
 # Module-level token provider for Azure OpenAI (reused across calls)
 _token_provider = None
 
+def get_azure_credential():
+    """Get the process-wide DefaultAzureCredential, creating it on first use."""
+    global _credential
+    if _credential is None:
+        # With a managed identity available, skip the slow Azure CLI subprocess probe
+        _credential = DefaultAzureCredential(
+            exclude_cli_credential=bool(os.getenv("IDENTITY_ENDPOINT"))
+        )
+    return _credential
+
 def get_azure_openai_token_provider():
     """Get a cached token provider for Azure OpenAI using DefaultAzureCredential."""
     global _token_provider
     if _token_provider is None:
-        credential = DefaultAzureCredential()
         _token_provider = get_bearer_token_provider(
-            credential, "https://cognitiveservices.azure.com/.default"
+            get_azure_credential(), "https://cognitiveservices.azure.com/.default"
         )
     return _token_provider
 
@@ -1,9 +1,5 @@
-import json
-import pandas as pd
-from azure.identity import DefaultAzureCredential
 from azure.ai.documentintelligence import DocumentIntelligenceClient
-from azure.ai.documentintelligence.models import DocumentAnalysisFeature
-from ai_ocr.azure.config import get_config
+from ai_ocr.azure.config import get_config, get_azure_credential
 
 
 def get_document_intelligence_client(cosmos_config_container=None):
@@ -11,7 +7,7 @@ def get_document_intelligence_client(cosmos_config_container=None):
     config = get_config(cosmos_config_container)
     return DocumentIntelligenceClient(
         endpoint=config["doc_intelligence_endpoint"],
-        credential=DefaultAzureCredential(),
+        credential=get_azure_credential(),
         headers={"solution":"ARGUS-1.0"}
     )
 
@@ -3,7 +3,6 @@ Mistral Document AI integration for OCR processing.
 Provides an alternative to Azure Document Intelligence using Mistral's Document AI API.
 """
 import base64
-import json
 import logging
 import httpx
 from typing import Optional
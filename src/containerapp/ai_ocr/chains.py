@@ -2,7 +2,7 @@ from openai import AzureOpenAI
 import logging
 import json
 import re
-from typing import List, Any, Dict, Optional
+from typing import List, Any, Dict
 from ai_ocr.azure.config import get_config
 
 def clean_json_response(raw_content: str) -> str:
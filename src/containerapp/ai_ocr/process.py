@@ -1,14 +1,11 @@
-import glob, logging, json, os, sys
+import glob, logging, json, os
 import fitz  # PyMuPDF
 from PIL import Image
-from pathlib import Path
-import io, uuid, shutil, tempfile
+import io, uuid, shutil, tempfile, time
 
 from datetime import datetime
 import tempfile 
-from azure.identity import DefaultAzureCredential
 from azure.cosmos import CosmosClient, exceptions
-from azure.core.exceptions import ResourceNotFoundError
 from PyPDF2 import PdfReader, PdfWriter
 
 def safe_parse_json(content: str) -> dict:
@@ -158,12 +155,13 @@ from ai_ocr.azure.openai_ops import load_image, get_size_of_base64_images
 from ai_ocr.chains import get_structured_data, get_summary_with_gpt, perform_gpt_evaluation_and_enrichment
 from ai_ocr.model import Config
 from ai_ocr.azure.images import convert_pdf_into_image
+from ai_ocr.azure.config import get_azure_credential
 
 def connect_to_cosmos():
     endpoint = os.environ['COSMOS_URL']
     database_name = os.environ['COSMOS_DB_NAME']
     container_name = os.environ['COSMOS_DOCUMENTS_CONTAINER_NAME']
-    client = CosmosClient(endpoint, DefaultAzureCredential())
+    client = CosmosClient(endpoint, get_azure_credential())
     database = client.get_database_client(database_name)
     docs_container = database.get_container_client(container_name)
     conf_container = database.get_container_client(os.environ['COSMOS_CONFIG_CONTAINER_NAME'])
@@ -229,12 +227,15 @@ def update_state(document: dict, container: any, state_name: str, state: bool, p
     container.upsert_item(document)
 
 def write_blob_to_temp_file(myblob):
-    file_content = myblob.read()
     file_name = myblob.name
     temp_file_path = os.path.join(tempfile.gettempdir(), file_name)
     os.makedirs(os.path.dirname(temp_file_path), exist_ok=True)
     with open(temp_file_path, 'wb') as file_to_write:
-        file_to_write.write(file_content)
+        # Stream straight to disk when the source supports it
+        if hasattr(myblob, 'readinto'):
+            myblob.readinto(file_to_write)
+        else:
+            file_to_write.write(myblob.read())
     # Get the size of the file
     file_size = os.path.getsize(temp_file_path)
     # If file is PDF calculate the number of pages in the PDF   
@@ -262,11 +263,51 @@ def split_pdf_into_subsets(pdf_path, max_pages_per_subset=10):
     return subset_paths
 
 
+# Per-dataset (prompt, schema, max_pages_per_chunk, processing_options) cache for blob
+# processing; local configuration writes invalidate it, other replicas pick changes up after the TTL
+MODEL_CONFIG_CACHE_TTL_SECONDS = float(os.getenv('MODEL_CONFIG_CACHE_TTL_SECONDS', '300'))
+_model_config_cache = {}
+
+def get_cached_model_prompt_and_schema(dataset_type):
+    """fetch_model_prompt_and_schema with a short-lived per-dataset cache"""
+    cached = _model_config_cache.get(dataset_type)
+    if cached is not None and cached[0] > time.monotonic():
+        return cached[1]
+    result = fetch_model_prompt_and_schema(dataset_type)
+    _model_config_cache[dataset_type] = (time.monotonic() + MODEL_CONFIG_CACHE_TTL_SECONDS, result)
+    return result
+
+# Configuration item as served by GET /api/configuration, reused briefly so repeated
+# page loads do not each read it from Cosmos DB; invalidated together with the cache above
+CONFIGURATION_ITEM_CACHE_TTL_SECONDS = 30
+_configuration_item_cache = None
+
+def get_cached_configuration_item(conf_container):
+    """Read the configuration item without Cosmos DB system properties, reusing a recent read"""
+    global _configuration_item_cache
+    cached = _configuration_item_cache
+    if cached is not None and cached[0] > time.monotonic():
+        return cached[1]
+    config_item = conf_container.read_item(item='configuration', partition_key='configuration')
+    # Strip the few system properties (_rid, _etag, _ts, ...) in place rather than
+    # copying the potentially large datasets payload into a new dict
+    for key in [key for key in config_item if key.startswith('_')]:
+        del config_item[key]
+    _configuration_item_cache = (time.monotonic() + CONFIGURATION_ITEM_CACHE_TTL_SECONDS, config_item)
+    return config_item
+
+def invalidate_model_config_cache():
+    """Drop cached dataset configurations after the configuration item changes"""
+    global _configuration_item_cache
+    _model_config_cache.clear()
+    _configuration_item_cache = None
+
 def fetch_model_prompt_and_schema(dataset_type, force_refresh=False):
     docs_container, conf_container = connect_to_cosmos()
 
     # If force refresh is requested, try to delete existing configuration
     if force_refresh:
+        invalidate_model_config_cache()
         try:
             conf_container.delete_item(item='configuration', partition_key='configuration')
             logging.info("Deleted existing configuration for force refresh")
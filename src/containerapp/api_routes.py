@@ -1,34 +1,59 @@
 """
 API route handlers for ARGUS Container App
 """
-import asyncio
 import copy
 import json
 import logging
 import os
+import time
 import traceback
 from datetime import datetime
 from typing import Dict, Any
 
+import orjson
 from fastapi import Request, BackgroundTasks, HTTPException
-from azure.identity import DefaultAzureCredential
 from openai import AzureOpenAI
 
-from models import EventGridEvent
-from blob_processing import process_blob_event
+from models import BLOB_TRANSFER_CONCURRENCY
+from blob_processing import (
+    process_blob_events, release_blob_event_slots, reserve_blob_event_slots, schedule_blob_events,
+    validate_blob_url
+)
 from dependencies import (
     get_blob_service_client, get_data_container, get_conf_container,
-    get_logic_app_manager, set_global_processing_semaphore
+    get_logic_app_manager, resize_global_processing_semaphore, get_credential,
+    resize_global_executor
 )
 
 # Import processing functions
-import sys
-sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'functionapp'))
-from ai_ocr.process import connect_to_cosmos, fetch_model_prompt_and_schema
+from ai_ocr.process import (
+    connect_to_cosmos, fetch_model_prompt_and_schema, get_cached_configuration_item, invalidate_model_config_cache
+)
 from ai_ocr.azure.config import get_config
 
 logger = logging.getLogger(__name__)
 
+# Storage account URL prefix is invariant per process, so it is resolved once
+_blob_url_prefix = None
+
+# Cached read-only view of the OpenAI settings (invalidated on update)
+_openai_settings_cache = None
+
+# Successful readiness results are reused for this long, so frequent probes from
+# every replica do not each cost a Storage call and a Cosmos query
+HEALTH_CHECK_CACHE_SECONDS = 30
+_last_health_check = None  # (time.monotonic() of the check, response payload)
+
+
+def _get_blob_url_prefix():
+    """Get the cached blob endpoint URL prefix for the configured storage account"""
+    global _blob_url_prefix
+    if _blob_url_prefix is None:
+        storage_account_name = os.getenv('AZURE_STORAGE_ACCOUNT_NAME')
+        if storage_account_name:
+            _blob_url_prefix = f"https://{storage_account_name}.blob.core.windows.net"
+    return _blob_url_prefix
+
 
 async def root():
     """Health check endpoint"""
@@ -37,6 +62,10 @@ async def root():
 
 async def health_check():
     """Detailed health check"""
+    global _last_health_check
+    if _last_health_check is not None and time.monotonic() - _last_health_check[0] < HEALTH_CHECK_CACHE_SECONDS:
+        return _last_health_check[1]
+    
     try:
         blob_service_client = get_blob_service_client()
         data_container = get_data_container()
@@ -55,7 +84,7 @@ async def health_check():
                 enable_cross_partition_query=True
             ))
         
-        return {
+        health = {
             "status": "healthy",
             "timestamp": datetime.utcnow().isoformat(),
             "services": {
@@ -63,16 +92,26 @@ async def health_check():
                 "cosmos_db": "connected"
             }
         }
+        # Failures are not cached, so a recovered dependency is reported on the next probe
+        _last_health_check = (time.monotonic(), health)
+        return health
     except Exception as e:
         logger.error(f"Health check failed: {e}")
         raise HTTPException(status_code=503, detail="Service unhealthy")
 
 
+def _reserve_processing_slots(count: int = 1):
+    """Reserve processing backlog slots before queueing work, answering 429 when the backlog is full"""
+    if not reserve_blob_event_slots(count):
+        logger.warning(f"Processing backlog full, rejecting {count} blob event(s) for retry")
+        raise HTTPException(status_code=429, detail="Processing backlog full, retry later")
+
+
 async def handle_blob_created(request: Request, background_tasks: BackgroundTasks):
     """Handle Event Grid blob created events"""
     try:
-        # Parse the Event Grid request
-        request_body = await request.json()
+        # Parse the Event Grid request; batches can be large, so use orjson over stdlib json
+        request_body = orjson.loads(await request.body())
         
         # Handle Event Grid subscription validation
         if isinstance(request_body, list) and len(request_body) > 0:
@@ -87,23 +126,32 @@ async def handle_blob_created(request: Request, background_tasks: BackgroundTask
         # Process blob created events
         events = request_body if isinstance(request_body, list) else [request_body]
         
+        blob_events = []
         for event_data in events:
-            event = EventGridEvent(event_data)
-            
-            if event.event_type == 'Microsoft.Storage.BlobCreated':
-                blob_url = event.data.get('url')
-                if blob_url and '/datasets/' in blob_url:
-                    logger.info(f"Processing blob created event for: {blob_url}")
-                    
-                    # Add to background tasks for async processing
-                    background_tasks.add_task(
-                        process_blob_event,
-                        blob_url,
-                        event.data
-                    )
+            # Read the event fields directly; most deliveries in a burst are filtered out here
+            if event_data.get('eventType') != 'Microsoft.Storage.BlobCreated':
+                continue
+            data = event_data.get('data') or {}
+            blob_url = data.get('url')
+            if blob_url and '/datasets/' in blob_url:
+                try:
+                    validate_blob_url(blob_url)
+                except ValueError as e:
+                    logger.warning(f"Ignoring blob created event: {e}")
+                    continue
+                logger.info(f"Processing blob created event for: {blob_url}")
+                blob_events.append((blob_url, data))
+        
+        # Queue the whole batch as one background task so events are processed
+        # concurrently rather than one after another
+        if blob_events:
+            _reserve_processing_slots(len(blob_events))
+            background_tasks.add_task(process_blob_events, blob_events)
         
         return {"status": "accepted", "message": "Events queued for processing"}
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error handling blob created event: {e}")
         logger.error(traceback.format_exc())
@@ -113,21 +161,24 @@ async def handle_blob_created(request: Request, background_tasks: BackgroundTask
 async def process_blob_manual(request: Request, background_tasks: BackgroundTasks):
     """Manually trigger blob processing (for testing)"""
     try:
-        request_body = await request.json()
+        request_body = orjson.loads(await request.body())
         blob_url = request_body.get('blob_url')
         
         if not blob_url:
             raise HTTPException(status_code=400, detail="blob_url is required")
+        try:
+            validate_blob_url(blob_url)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         
         # Add to background tasks
-        background_tasks.add_task(
-            process_blob_event,
-            blob_url,
-            {"url": blob_url}
-        )
+        _reserve_processing_slots()
+        background_tasks.add_task(process_blob_events, [(blob_url, {"url": blob_url})])
         
         return {"status": "accepted", "message": "Blob queued for processing"}
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error in manual blob processing: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
@@ -141,11 +192,8 @@ async def get_configuration():
             raise HTTPException(status_code=503, detail="Configuration container not available")
         
         try:
-            # Try to get the main configuration item
-            config_item = conf_container.read_item(item='configuration', partition_key='configuration')
-            # Remove Cosmos DB specific fields
-            clean_config = {k: v for k, v in config_item.items() if not k.startswith('_')}
-            return clean_config
+            # Get the main configuration item, without Cosmos DB specific fields
+            return get_cached_configuration_item(conf_container)
         except Exception as e:
             logger.warning(f"Configuration item not found, returning default: {e}")
             # Return default configuration structure
@@ -167,7 +215,7 @@ async def update_configuration(request: Request):
         if not conf_container:
             raise HTTPException(status_code=503, detail="Configuration container not available")
         
-        config_data = await request.json()
+        config_data = orjson.loads(await request.body())
         
         # Ensure the configuration has required fields
         if "id" not in config_data:
@@ -177,6 +225,7 @@ async def update_configuration(request: Request):
         
         # Upsert the single configuration item
         conf_container.upsert_item(config_data)
+        invalidate_model_config_cache()
         
         return {"status": "success", "message": "Configuration updated"}
         
@@ -249,7 +298,7 @@ async def update_concurrency_settings(request: Request):
         if not logic_app_manager:
             raise HTTPException(status_code=503, detail="Logic App Manager not initialized")
         
-        request_body = await request.json()
+        request_body = orjson.loads(await request.body())
         max_runs = request_body.get('max_runs')
         
         if max_runs is None:
@@ -264,10 +313,11 @@ async def update_concurrency_settings(request: Request):
             error_msg = result.get("error", "Unknown error occurred")
             raise HTTPException(status_code=400, detail=error_msg)
         
-        # Update the global semaphore to match the new concurrency setting
-        global_processing_semaphore = asyncio.Semaphore(max_runs)
-        set_global_processing_semaphore(global_processing_semaphore)
+        # Update the global semaphore to match the new concurrency setting; in-flight
+        # documents keep their permits and release them into the same semaphore
+        resize_global_processing_semaphore(max_runs)
         logger.info(f"Updated global processing semaphore to allow {max_runs} concurrent operations")
+        resize_global_executor(max_runs)
         
         # Add semaphore info to the result
         result["backend_semaphore_updated"] = True
@@ -311,7 +361,7 @@ async def update_full_concurrency_settings(request: Request):
         if not logic_app_manager:
             raise HTTPException(status_code=503, detail="Logic App Manager not initialized")
         
-        request_body = await request.json()
+        request_body = orjson.loads(await request.body())
         max_runs = request_body.get('max_runs')
         
         if max_runs is None:
@@ -338,7 +388,7 @@ async def update_full_concurrency_settings(request: Request):
 async def process_file(request: Request, background_tasks: BackgroundTasks):
     """Process file endpoint called by Logic App"""
     try:
-        request_body = await request.json()
+        request_body = orjson.loads(await request.body())
         logger.info(f"Received process-file request: {request_body}")
         
         # Extract parameters from Logic App request
@@ -352,8 +402,8 @@ async def process_file(request: Request, background_tasks: BackgroundTasks):
             raise HTTPException(status_code=400, detail="Missing required parameters: filename, dataset, blob_path")
         
         # Convert to blob URL format expected by our processing function
-        storage_account_name = os.getenv('AZURE_STORAGE_ACCOUNT_NAME')
-        if not storage_account_name:
+        blob_url_prefix = _get_blob_url_prefix()
+        if not blob_url_prefix:
             raise HTTPException(status_code=500, detail="Storage account name not configured")
         
         # Parse the blob_path to extract container and blob name
@@ -362,22 +412,22 @@ async def process_file(request: Request, background_tasks: BackgroundTasks):
             raise HTTPException(status_code=400, detail="Invalid blob_path format. Expected: /container/blob-name")
         
         container_name, blob_name = path_parts
-        blob_url = f"https://{storage_account_name}.blob.core.windows.net/{container_name}/{blob_name}"
+        blob_url = f"{blob_url_prefix}/{container_name}/{blob_name}"
         
         logger.info(f"Processing file: {filename} from dataset: {dataset}")
         logger.info(f"Blob path: {blob_path}")
         logger.info(f"Constructed blob URL: {blob_url}")
         
         # Add to background tasks using our existing processing function
+        _reserve_processing_slots()
         background_tasks.add_task(
-            process_blob_event,
-            blob_url,
-            {
+            process_blob_events,
+            [(blob_url, {
                 "url": blob_url,
                 "filename": filename,
                 "dataset": dataset,
                 "trigger_source": trigger_source
-            }
+            })]
         )
         
         return {
@@ -398,9 +448,13 @@ async def process_file(request: Request, background_tasks: BackgroundTasks):
 
 async def get_openai_settings():
     """Get current OpenAI configuration from environment variables (read-only)"""
+    global _openai_settings_cache
     try:
+        if _openai_settings_cache is not None:
+            return _openai_settings_cache
+        
         # Return current environment variable values (for display purposes only)
-        return {
+        _openai_settings_cache = {
             "openai_endpoint": os.getenv("AZURE_OPENAI_ENDPOINT", ""),
             "openai_key": "***HIDDEN***" if os.getenv("AZURE_OPENAI_KEY") else "",
             "deployment_name": os.getenv("AZURE_OPENAI_MODEL_DEPLOYMENT_NAME", ""),
@@ -410,6 +464,7 @@ async def get_openai_settings():
             "mistral_model": os.getenv("MISTRAL_DOC_AI_MODEL", "mistral-document-ai-2505"),
             "note": "Configuration is read from environment variables only. Update via deployment/infrastructure."
         }
+        return _openai_settings_cache
         
     except Exception as e:
         logger.error(f"Error fetching OpenAI settings: {e}")
@@ -418,6 +473,7 @@ async def get_openai_settings():
 
 async def update_openai_settings(request: Request):
     """Update OpenAI settings by modifying environment variables"""
+    global _openai_settings_cache
     try:
         data = await request.json()
         
@@ -437,6 +493,9 @@ async def update_openai_settings(request: Request):
         if "mistral_model" in data:
             os.environ["MISTRAL_DOC_AI_MODEL"] = data["mistral_model"]
         
+        # Invalidate the cached settings so the next read reflects the update
+        _openai_settings_cache = None
+        
         # Return success response with updated config (hide keys)
         updated_config = {
             "openai_endpoint": os.environ.get("AZURE_OPENAI_ENDPOINT", ""),
@@ -960,7 +1019,6 @@ async def _execute_mcp_tool(tool_name: str, arguments: dict) -> Any:
                 return {"error": "document_id and question are required"}
             
             # Use the existing chat endpoint logic
-            from fastapi import Request as FakeRequest
             class MockRequest:
                 async def json(self):
                     return {"document_id": document_id, "message": question, "chat_history": []}
@@ -1052,7 +1110,9 @@ async def _execute_mcp_tool(tool_name: str, arguments: dict) -> Any:
                     "run_evaluation": True
                 }
             }
-            asyncio.create_task(process_blob_event(blob_url, event_data))
+            if not reserve_blob_event_slots(1):
+                return {"error": "Processing backlog full, retry later"}
+            schedule_blob_events([(blob_url, event_data)])
             
             return {"status": "queued", "blob_url": blob_url, "dataset": dataset}
         
@@ -1259,7 +1319,7 @@ async def get_concurrency_diagnostics():
             try:
                 diagnostics["azure_credentials_test"] = "Testing..."
                 # Simple credential test
-                credential_test = DefaultAzureCredential()
+                credential_test = get_credential()
                 # This will fail if credentials are not working, but won't actually call Azure
                 diagnostics["azure_credentials_available"] = True
             except Exception as e:
@@ -1480,6 +1540,9 @@ async def reprocess_document(document_id: str, background_tasks: BackgroundTasks
         else:
             raise HTTPException(status_code=503, detail="Blob storage not available for reprocessing")
         
+        # Admit the reprocessing run before touching the stored document
+        _reserve_processing_slots()
+        
         # Reset document state
         item["state"] = {
             "file_landed": True,
@@ -1495,14 +1558,14 @@ async def reprocess_document(document_id: str, background_tasks: BackgroundTasks
             "error": False
         }
         item["errors"] = []
-        data_container.upsert_item(item)
+        try:
+            data_container.upsert_item(item)
+        except Exception:
+            release_blob_event_slots(1)
+            raise
         
         # Queue for reprocessing
-        background_tasks.add_task(
-            process_blob_event,
-            blob_url,
-            {"url": blob_url}
-        )
+        background_tasks.add_task(process_blob_events, [(blob_url, {"url": blob_url})])
         
         return {"status": "success", "message": f"Document {document_id} queued for reprocessing"}
         
@@ -1623,7 +1686,16 @@ async def upload_file(dataset_name: str, request: Request, background_tasks: Bac
         container_client = blob_service_client.get_container_client(container_name)
         blob_client = container_client.get_blob_client(blob_path)
         
-        blob_client.upload_blob(content, overwrite=True)
+        # Admit the processing run before uploading so a full backlog rejects the request up front
+        run_processing = run_ocr or run_gpt_vision or run_summary or run_evaluation
+        if run_processing:
+            _reserve_processing_slots()
+        try:
+            blob_client.upload_blob(content, overwrite=True, max_concurrency=BLOB_TRANSFER_CONCURRENCY)
+        except Exception:
+            if run_processing:
+                release_blob_event_slots(1)
+            raise
         
         # Get the blob URL
         blob_url = blob_client.url
@@ -1632,11 +1704,10 @@ async def upload_file(dataset_name: str, request: Request, background_tasks: Bac
         document_id = blob_path.replace('/', '__')
         
         # Queue for processing if any processing options are enabled
-        if run_ocr or run_gpt_vision or run_summary or run_evaluation:
+        if run_processing:
             background_tasks.add_task(
-                process_blob_event,
-                blob_url,
-                {
+                process_blob_events,
+                [(blob_url, {
                     "url": blob_url,
                     "processing_options": {
                         "run_ocr": run_ocr,
@@ -1644,7 +1715,7 @@ async def upload_file(dataset_name: str, request: Request, background_tasks: Bac
                         "run_summary": run_summary,
                         "run_evaluation": run_evaluation
                     }
-                }
+                })]
             )
         
         return {
@@ -1662,7 +1733,7 @@ async def upload_file(dataset_name: str, request: Request, background_tasks: Bac
         raise HTTPException(status_code=500, detail=f"Failed to upload file: {str(e)}")
 
 
-async def get_upload_url(filename: str, dataset_name: str = "default-dataset"):
+async def get_upload_url(filename: str, dataset: str = "default-dataset"):
     """Generate a SAS URL for direct blob upload"""
     from datetime import timedelta
     from azure.storage.blob import generate_blob_sas, BlobSasPermissions
@@ -1673,7 +1744,7 @@ async def get_upload_url(filename: str, dataset_name: str = "default-dataset"):
     
     try:
         container_name = os.getenv('STORAGE_CONTAINER_NAME', 'datasets')
-        blob_path = f"{dataset_name}/{filename}"
+        blob_path = f"{dataset}/{filename}"
         
         # Get account info
         account_name = blob_service_client.account_name
@@ -1723,7 +1794,7 @@ async def get_upload_url(filename: str, dataset_name: str = "default-dataset"):
                 "Content-Type": content_type
             },
             "filename": filename,
-            "dataset": dataset_name,
+            "dataset": dataset,
             "blob_path": blob_path,
             "expires_in": "1 hour",
             "instructions": [
@@ -1783,7 +1854,7 @@ async def get_document_file(document_id: str):
             raise HTTPException(status_code=404, detail="File not found in storage")
         
         # Download blob content
-        blob_data = blob_client.download_blob().readall()
+        blob_data = blob_client.download_blob(max_concurrency=BLOB_TRANSFER_CONCURRENCY).readall()
         
         # Determine content type
         filename = blob_name.split('/')[-1].lower()
@@ -1889,6 +1960,7 @@ async def create_dataset(
         
         # Upsert the configuration
         conf_container.upsert_item(body=config_item)
+        invalidate_model_config_cache()
         
         logger.info(f"Created dataset '{dataset_name}' successfully")
         
@@ -2,56 +2,95 @@
 Blob processing functionality for ARGUS Container App
 """
 import asyncio
-import copy
+import functools
 import logging
+import operator
 import os
-import shutil
-import threading
+import re
+import time
 import traceback
 from datetime import datetime
 from typing import Dict, Any
+from urllib.parse import urlsplit
 
 from models import BlobInputStream
 from dependencies import (
-    get_blob_service_client, get_data_container, get_global_executor, 
+    get_blob_service_client_for_host, get_data_container, get_global_process_executor,
     get_global_processing_semaphore
 )
 
-# Import processing functions
-import sys
-sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'functionapp'))
-from ai_ocr.process import (
-    run_ocr_processing, run_gpt_extraction, run_gpt_evaluation, run_gpt_summary,
-    prepare_images, initialize_document, update_state, 
-    write_blob_to_temp_file, fetch_model_prompt_and_schema, 
-    split_pdf_into_subsets
-)
-from ai_ocr.model import Config
-
 logger = logging.getLogger(__name__)
 
+# Processing module (OCR, PDF and image libraries), imported on first use
+_ai_ocr = None
+
+# Page range suffix appended by split_pdf_into_subsets: <file>_subset_<start>_<end>.pdf (0-indexed)
+_SUBSET_RE = re.compile(r'_subset_(\d+)_(\d+)\.pdf$')
+
+# Whitespace that needs collapsing when joining strings: runs of 2+ or any non-space whitespace
+_WHITESPACE_CLEANUP_RE = re.compile(r'\s{2,}|[^\S ]')
+
+# Maximum number of document chunks processed in parallel within a single blob
+CHUNK_CONCURRENCY = max(1, int(os.getenv('CHUNK_CONCURRENCY', '4')))
+
+# Strong references to fire-and-forget cleanup tasks so they are not garbage collected
+_background_cleanup_tasks = set()
+
+# Strong references to blob event batches scheduled outside a request's BackgroundTasks
+_background_processing_tasks = set()
+
+# Event Grid blob events accepted but not yet finished; further deliveries are
+# rejected with a 429 so Event Grid retries them later instead of queueing here
+MAX_PENDING_BLOB_EVENTS = max(1, int(os.getenv('MAX_PENDING_BLOB_EVENTS', '100')))
+_pending_blob_events = 0
+
+# Event Grid blob events (URL without query string, blob version) currently being
+# processed, so a redelivered event does not run OCR and GPT extraction a second time
+_inflight_blob_events = set()
+
+
+def _load_ai_ocr():
+    """Import the ai_ocr processing module on first use and cache it"""
+    global _ai_ocr
+    if _ai_ocr is None:
+        from ai_ocr import process
+        _ai_ocr = process
+    return _ai_ocr
+
+
+def _resolve_blob_url(blob_url: str):
+    """
+    Split a blob URL into its service client, container and blob name.
+    
+    Raises ValueError for malformed URLs and for hosts other than the allowed
+    storage accounts, before any request (and token) is sent to them.
+    """
+    # Format: https://accountname.blob.core.windows.net/container/blob[?sas]
+    url = urlsplit(blob_url)
+    path_parts = url.path.lstrip('/').split('/', 1)
+    if url.scheme != 'https' or not url.hostname or len(path_parts) != 2 or not all(path_parts):
+        raise ValueError(f"Invalid blob URL, expected https://<account host>/<container>/<blob>: {blob_url}")
+    container_name, blob_name = path_parts
+    # hostname drops any userinfo and port and is lower-cased
+    return get_blob_service_client_for_host(url.hostname), container_name, blob_name
+
 
-def create_blob_input_stream(blob_url: str) -> BlobInputStream:
-    """Create a BlobInputStream from a blob URL"""
+def validate_blob_url(blob_url: str):
+    """Raise ValueError unless blob_url names a blob in an allowed storage account"""
+    _resolve_blob_url(blob_url)
+
+
+def create_blob_input_stream(blob_url: str, blob_size: int = None) -> BlobInputStream:
+    """Create a BlobInputStream from a blob URL without any network round trip"""
     try:
-        # Parse blob URL to get container and blob name
-        # Format: https://accountname.blob.core.windows.net/container/blob
-        url_parts = blob_url.replace('https://', '').split('/')
-        account_name = url_parts[0].split('.')[0]
-        container_name = url_parts[1]
-        blob_name = '/'.join(url_parts[2:])
-        
-        # Get blob client
-        blob_service_client = get_blob_service_client()
+        # Get blob client from the cached service client for this account
+        blob_service_client, container_name, blob_name = _resolve_blob_url(blob_url)
         blob_client = blob_service_client.get_blob_client(
             container=container_name,
             blob=blob_name
         )
         
-        # Get blob properties
-        blob_properties = blob_client.get_blob_properties()
-        blob_size = blob_properties.size
-        
+        # Event Grid events carry the size; otherwise BlobInputStream fetches it on demand
         return BlobInputStream(blob_name, blob_size, blob_client)
         
     except Exception as e:
@@ -59,21 +98,19 @@ def create_blob_input_stream(blob_url: str) -> BlobInputStream:
         raise
 
 
-def process_blob_async(blob_input_stream: BlobInputStream, data_container):
+async def process_blob_async(blob_input_stream: BlobInputStream, data_container):
     """Process blob asynchronously - same logic as original function"""
-    thread_id = threading.current_thread().ident
-    
     try:
-        logger.info(f"[Thread-{thread_id}] Starting blob processing: {blob_input_stream.name}")
+        logger.info("Starting blob processing: %s", blob_input_stream.name)
         
         start_time = datetime.now()
-        process_blob(blob_input_stream, data_container)
+        await process_blob(blob_input_stream, data_container)
         end_time = datetime.now()
         
-        logger.info(f"[Thread-{thread_id}] Successfully processed blob: {blob_input_stream.name} in {(end_time - start_time).total_seconds():.2f}s")
+        logger.info("Successfully processed blob: %s in %.2fs", blob_input_stream.name, (end_time - start_time).total_seconds())
         
     except Exception as e:
-        logger.error(f"[Thread-{thread_id}] Error processing blob {blob_input_stream.name}: {e}")
+        logger.error(f"Error processing blob {blob_input_stream.name}: {e}")
         logger.error(traceback.format_exc())
         raise
 
@@ -90,66 +127,112 @@ def handle_timeout_error_async(blob_input_stream: BlobInputStream, data_containe
 
 async def process_blob_event(blob_url: str, event_data: Dict[str, Any]):
     """Process a single blob event in the background with concurrency control"""
+    # Event Grid delivers at least once. A redelivery carries the same blob eTag
+    # (or sequencer), while an overwrite gets a new one; explicit submissions such as
+    # uploads and reprocess requests carry neither and are never deduplicated.
+    # The check and add run without an await in between, so they are atomic.
+    blob_version = (event_data or {}).get('eTag') or (event_data or {}).get('sequencer')
+    event_key = (blob_url.split('?', 1)[0], blob_version) if blob_version else None
+    if event_key is not None:
+        if event_key in _inflight_blob_events:
+            logger.warning(f"Dropping duplicate blob event, already processing: {event_key[0]} ({blob_version})")
+            return
+        _inflight_blob_events.add(event_key)
+    
     try:
         # Create blob input stream
-        blob_input_stream = create_blob_input_stream(blob_url)
+        blob_size = event_data.get('contentLength') if event_data else None
+        blob_input_stream = create_blob_input_stream(blob_url, blob_size)
         
-        logger.info(f"Processing blob event for: {blob_input_stream.name}")
+        logger.info("Processing blob event for: %s", blob_input_stream.name)
         
         # Use semaphore to control concurrency
         global_processing_semaphore = get_global_processing_semaphore()
-        global_executor = get_global_executor()
         data_container = get_data_container()
         
         if global_processing_semaphore:
             async with global_processing_semaphore:
-                logger.info(f"Acquired semaphore for processing: {blob_input_stream.name}")
+                logger.info("Acquired semaphore for processing: %s", blob_input_stream.name)
                 
-                # Use global ThreadPoolExecutor for processing
-                if global_executor:
-                    # Run in executor but await the result to maintain semaphore control
-                    loop = asyncio.get_event_loop()
-                    await loop.run_in_executor(
-                        global_executor,
-                        process_blob_async,
-                        blob_input_stream,
-                        data_container
-                    )
-                    logger.info(f"Completed processing for: {blob_input_stream.name}")
-                else:
-                    logger.error("Global executor not available")
+                # Blocking I/O inside the pipeline is offloaded per call, so the
+                # event loop stays free to multiplex other blobs
+                await process_blob_async(blob_input_stream, data_container)
+                logger.info("Completed processing for: %s", blob_input_stream.name)
         else:
             logger.error("Global processing semaphore not available")
                 
     except Exception as e:
         logger.error(f"Error in background blob processing: {e}")
         logger.error(traceback.format_exc())
+    finally:
+        if event_key is not None:
+            _inflight_blob_events.discard(event_key)
+
+
+def reserve_blob_event_slots(count: int) -> bool:
+    """Reserve backlog slots for a batch of blob events, returning False when the backlog is full"""
+    global _pending_blob_events
+    if _pending_blob_events and _pending_blob_events + count > MAX_PENDING_BLOB_EVENTS:
+        return False
+    _pending_blob_events += count
+    return True
+
+
+def release_blob_event_slots(count: int):
+    """Return backlog slots reserved with reserve_blob_event_slots"""
+    global _pending_blob_events
+    _pending_blob_events -= count
+
+
+async def _process_reserved_blob_event(blob_url: str, event_data: Dict[str, Any]):
+    try:
+        await process_blob_event(blob_url, event_data)
+    finally:
+        release_blob_event_slots(1)
+
+
+async def process_blob_events(blob_events):
+    """Process a batch of blob events reserved with reserve_blob_event_slots within a single background task"""
+    results = await asyncio.gather(
+        *(_process_reserved_blob_event(blob_url, event_data) for blob_url, event_data in blob_events),
+        return_exceptions=True
+    )
+    for (blob_url, _), result in zip(blob_events, results):
+        if isinstance(result, BaseException):
+            logger.error(f"Unhandled error processing blob event for {blob_url}: {result}")
+
+
+def schedule_blob_events(blob_events):
+    """Run process_blob_events as a tracked background task for callers without BackgroundTasks"""
+    task = asyncio.create_task(process_blob_events(blob_events))
+    _background_processing_tasks.add(task)
+    task.add_done_callback(_background_processing_tasks.discard)
+    return task
 
 
 def initialize_document_data(blob_name: str, temp_file_path: str, num_pages: int, file_size: int, data_container):
     """Initialize document data for processing"""
+    ai_ocr = _load_ai_ocr()
     timer_start = datetime.now()
     
     # Determine dataset type from blob name
-    logger.info(f"Processing blob with name: {blob_name}")
+    logger.info("Processing blob with name: %s", blob_name)
     
-    # Handle blob path parsing
-    blob_parts = blob_name.split('/')
-    if len(blob_parts) < 2:
+    # Handle blob path parsing: the first path segment is the dataset type
+    dataset_type, separator, _ = blob_name.partition('/')
+    if not separator:
         # If no folder structure, default to 'default-dataset'
         logger.warning(f"Blob name {blob_name} doesn't contain folder structure, defaulting to 'default-dataset'")
         dataset_type = 'default-dataset'
-    else:
-        dataset_type = blob_parts[0]  # Take the first part as dataset type
     
-    logger.info(f"Using dataset type: {dataset_type}")
+    logger.info("Using dataset type: %s", dataset_type)
     
-    prompt, json_schema, max_pages_per_chunk, processing_options = fetch_model_prompt_and_schema(dataset_type)
+    prompt, json_schema, max_pages_per_chunk, processing_options = ai_ocr.get_cached_model_prompt_and_schema(dataset_type)
     if prompt is None or json_schema is None:
         raise ValueError("Failed to fetch model prompt and schema from configuration.")
     
-    document = initialize_document(blob_name, file_size, num_pages, prompt, json_schema, timer_start, dataset_type, max_pages_per_chunk, processing_options)
-    update_state(document, data_container, 'file_landed', True, (datetime.now() - timer_start).total_seconds())
+    document = ai_ocr.initialize_document(blob_name, file_size, num_pages, prompt, json_schema, timer_start, dataset_type, max_pages_per_chunk, processing_options)
+    ai_ocr.update_state(document, data_container, 'file_landed', True, (datetime.now() - timer_start).total_seconds())
     return document
 
 
@@ -166,67 +249,130 @@ def merge_extracted_data(gpt_responses):
     if not gpt_responses:
         return {}
     
-    # Start with the first response as base
-    merged_data = copy.deepcopy(gpt_responses[0]) if gpt_responses else {}
+    # Start with a private copy of the first response as base, then merge the
+    # remaining responses into it in place
+    merged_data = _json_clone(gpt_responses[0])
     
-    # Merge remaining responses
     for response in gpt_responses[1:]:
-        merged_data = _deep_merge_data(merged_data, response)
+        if isinstance(merged_data, dict) and isinstance(response, dict):
+            _merge_into(merged_data, response)
+        elif response:
+            merged_data = _json_clone(response)
     
     return merged_data
 
 
-def _deep_merge_data(base_data, new_data):
+def _json_clone(value):
     """
-    Deep merge two data dictionaries with intelligent type handling.
-    """
-    if not isinstance(base_data, dict) or not isinstance(new_data, dict):
-        return new_data if new_data else base_data
+    Copy a JSON-shaped value (dicts, lists and immutable leaves).
     
-    result = copy.deepcopy(base_data)
+    Much cheaper than copy.deepcopy since GPT responses never contain
+    shared references or custom objects that need memo bookkeeping.
+    """
+    if isinstance(value, dict):
+        return {key: _json_clone(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_json_clone(item) for item in value]
+    return value
+
+
+def _merge_strings(existing_value, value):
+    combined = f"{existing_value} {value}".strip()
+    return _WHITESPACE_CLEANUP_RE.sub(' ', combined)  # Clean up multiple spaces
+
+
+# Merge functions keyed by the exact (existing, new) value types; dict and list
+# pairs are handled in place by _merge_into and anything else prefers non-empty values
+_NUMBER_TYPES = (int, float, bool)
+_MISSING = object()
+_MERGE_FUNCTIONS = {
+    (str, str): _merge_strings,
+    **{(a, b): operator.add for a in _NUMBER_TYPES for b in _NUMBER_TYPES},
+}
+
+
+def _merge_into(target, source):
+    """
+    Deep merge source into target with intelligent type handling.
     
-    for key, value in new_data.items():
-        if key not in result:
-            result[key] = copy.deepcopy(value)
-        else:
-            existing_value = result[key]
-            
-            # Handle different data types appropriately
-            if isinstance(existing_value, list) and isinstance(value, list):
-                # Concatenate lists
-                result[key] = existing_value + value
-            elif isinstance(existing_value, str) and isinstance(value, str):
-                # Join strings with space, clean up multiple spaces
-                combined = f"{existing_value} {value}".strip()
-                result[key] = " ".join(combined.split())  # Clean up multiple spaces
-            elif isinstance(existing_value, (int, float)) and isinstance(value, (int, float)):
-                # Sum numbers
-                result[key] = existing_value + value
-            elif isinstance(existing_value, dict) and isinstance(value, dict):
-                # Recursively merge dictionaries
-                result[key] = _deep_merge_data(existing_value, value)
+    target must be privately owned by the caller: nested dicts are merged and
+    lists extended in place, so each merge costs only the size of source
+    instead of reallocating every list merged so far. Values taken from source
+    are cloned, so source is never aliased or mutated. Nested dicts are merged
+    with an explicit worklist instead of recursion, so deeply nested
+    extraction schemas cannot hit the recursion limit.
+    """
+    pending = [(target, source)]
+    while pending:
+        target, source = pending.pop()
+        for key, value in source.items():
+            existing_value = target.get(key, _MISSING)
+            if existing_value is _MISSING:
+                target[key] = _json_clone(value)
+                continue
+            value_types = (type(existing_value), type(value))
+            if value_types == (dict, dict):
+                pending.append((existing_value, value))
+            elif value_types == (list, list):
+                existing_value.extend(map(_json_clone, value))
             else:
-                # For other types or type mismatches, prefer non-empty values
-                if value:  # Use new value if it's truthy
-                    result[key] = value
-                # Otherwise keep existing value
-    
-    return result
+                merge = _MERGE_FUNCTIONS.get(value_types)
+                if merge is not None:
+                    target[key] = merge(existing_value, value)
+                elif value:
+                    target[key] = _json_clone(value)
+
 
+def _set_document_state(document, state_name: str, state: bool, processing_time: float = None):
+    """Record a processing step's state on the in-memory document without persisting it"""
+    document['state'][state_name] = state
+    if processing_time is not None:
+        document['state'][f"{state_name}_time_seconds"] = processing_time
 
-def update_final_document(document, gpt_response, ocr_response, evaluation_result, processing_times, data_container):
-    """Update the final document with all processing results"""
-    timer_stop = datetime.now()
-    document['properties']['total_time_seconds'] = (timer_stop - datetime.fromisoformat(document['properties']['request_timestamp'])).total_seconds()
+
+def patch_document_state(document, data_container, state_name: str, state: bool, processing_time: float = None):
+    """
+    Record a processing step's state and persist only the state sub-document.
+    
+    Intermediate progress is written with a single patch operation instead of
+    re-upserting the whole document; the full document is upserted once when
+    processing finishes (or fails).
+    """
+    _set_document_state(document, state_name, state, processing_time)
+    data_container.patch_item(
+        item=document['id'],
+        partition_key={},
+        patch_operations=[{"op": "set", "path": "/state", "value": document['state']}]
+    )
+
+
+def update_final_document(document, gpt_response, ocr_output, evaluation_result, processing_times, data_container, request_started):
+    """Update the final document with all processing results (request_started is a time.perf_counter() value)"""
+    ai_ocr = _load_ai_ocr()
+    document['properties']['total_time_seconds'] = time.perf_counter() - request_started
     
     document['extracted_data'].update({
         "gpt_extraction_output_with_evaluation": evaluation_result,
         "gpt_extraction_output": gpt_response,
-        "ocr_output": '\n'.join(str(result) for result in ocr_response)
+        "ocr_output": ocr_output
     })
     
     document['state']['processing_completed'] = True
-    update_state(document, data_container, 'processing_completed', True)
+    ai_ocr.update_state(document, data_container, 'processing_completed', True)
+
+
+def _fast_rmtree(path):
+    """
+    Remove a directory tree using os.scandir, which reuses the directory
+    entry type information instead of stat-ing every rendered page image.
+    """
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                _fast_rmtree(entry.path)
+            else:
+                os.unlink(entry.path)
+    os.rmdir(path)
 
 
 def cleanup_temp_resources(temp_dirs, file_paths, temp_file_path):
@@ -237,41 +383,74 @@ def cleanup_temp_resources(temp_dirs, file_paths, temp_file_path):
     
     # Clean up temporary directories
     for temp_dir in temp_dirs:
+        if not temp_dir:
+            continue
         try:
-            if temp_dir and os.path.exists(temp_dir):
-                shutil.rmtree(temp_dir)
-                logger.info(f"Cleaned up temporary directory: {temp_dir}")
+            _fast_rmtree(temp_dir)
+            logger.info("Cleaned up temporary directory: %s", temp_dir)
+        except FileNotFoundError:
+            pass
         except Exception as e:
             logger.warning(f"Failed to clean up temp directory {temp_dir}: {e}")
     
     # Clean up split PDF files (but not the original temp file)
     for file_path in file_paths:
+        if not file_path or file_path == temp_file_path:
+            continue
         try:
-            if file_path and file_path != temp_file_path and os.path.exists(file_path):
-                os.remove(file_path)
-                logger.info(f"Cleaned up split file: {file_path}")
+            os.unlink(file_path)
+            logger.info("Cleaned up split file: %s", file_path)
+        except FileNotFoundError:
+            pass
         except Exception as e:
             logger.warning(f"Failed to clean up split file {file_path}: {e}")
     
     # Clean up the main temporary file
-    try:
-        if temp_file_path and os.path.exists(temp_file_path):
-            os.remove(temp_file_path)
-            logger.info(f"Cleaned up main temp file: {temp_file_path}")
-    except Exception as e:
-        logger.warning(f"Failed to clean up main temp file {temp_file_path}: {e}")
+    if temp_file_path:
+        try:
+            os.unlink(temp_file_path)
+            logger.info("Cleaned up main temp file: %s", temp_file_path)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"Failed to clean up main temp file {temp_file_path}: {e}")
+
+
+async def run_cpu_bound(func, *args, **kwargs):
+    """Run a picklable CPU-bound function in the process pool, or in a worker thread before startup"""
+    executor = get_global_process_executor()
+    if executor is None:
+        return await asyncio.to_thread(func, *args, **kwargs)
+    return await asyncio.get_running_loop().run_in_executor(executor, functools.partial(func, *args, **kwargs))
+
 
+def schedule_temp_cleanup(temp_dirs, file_paths, temp_file_path):
+    """Run cleanup_temp_resources in a worker thread without blocking the caller"""
+    task = asyncio.create_task(
+        asyncio.to_thread(cleanup_temp_resources, list(temp_dirs), list(file_paths), temp_file_path)
+    )
+    _background_cleanup_tasks.add(task)
+    task.add_done_callback(_background_cleanup_tasks.discard)
+    return task
 
-def process_blob(blob_input_stream: BlobInputStream, data_container):
+
+async def process_blob(blob_input_stream: BlobInputStream, data_container):
     """Process a blob for OCR and data extraction (adapted for container app)"""
-    overall_start_time = datetime.now()
-    temp_file_path, num_pages, file_size = write_blob_to_temp_file(blob_input_stream)
+    ai_ocr = _load_ai_ocr()
+    overall_start_time = time.perf_counter()
+    temp_file_path, num_pages, file_size = await asyncio.to_thread(ai_ocr.write_blob_to_temp_file, blob_input_stream)
     logger.info("processing blob")
-    document = initialize_document_data(blob_input_stream.name, temp_file_path, num_pages, file_size, data_container)
+    # Matches the document's request_timestamp, taken when the document is initialized
+    request_started = time.perf_counter()
+    document = await asyncio.to_thread(
+        initialize_document_data, blob_input_stream.name, temp_file_path, num_pages, file_size, data_container
+    )
     
     processing_times = {}
     file_paths = []
     temp_dirs = []
+    pipeline_tasks = []
+    summary_time = 0
     
     try:
         # Get processing options from document
@@ -282,10 +461,11 @@ def process_blob(blob_input_stream: BlobInputStream, data_container):
             "enable_evaluation": True
         })
         
-        logger.info(f"Processing options: OCR={processing_options.get('include_ocr', True)}, "
-                   f"Images={processing_options.get('include_images', True)}, "
-                   f"Summary={processing_options.get('enable_summary', True)}, "
-                   f"Evaluation={processing_options.get('enable_evaluation', True)}")
+        logger.info("Processing options: OCR=%s, Images=%s, Summary=%s, Evaluation=%s",
+                    processing_options.get('include_ocr', True),
+                    processing_options.get('include_images', True),
+                    processing_options.get('enable_summary', True),
+                    processing_options.get('enable_evaluation', True))
         
         max_pages_per_chunk = document['model_input'].get('max_pages_per_chunk', 10)
         
@@ -297,70 +477,132 @@ def process_blob(blob_input_stream: BlobInputStream, data_container):
             logger.warning(f"Large max_pages_per_chunk: {max_pages_per_chunk}, consider reducing for better performance")
         
         if num_pages and num_pages > max_pages_per_chunk:
-            file_paths = split_pdf_into_subsets(temp_file_path, max_pages_per_subset=max_pages_per_chunk)
-            logger.info(f"Split {num_pages} pages into {len(file_paths)} chunks of max {max_pages_per_chunk} pages each")
+            file_paths = await run_cpu_bound(ai_ocr.split_pdf_into_subsets, temp_file_path, max_pages_per_subset=max_pages_per_chunk)
+            logger.info("Split %s pages into %s chunks of max %s pages each", num_pages, len(file_paths), max_pages_per_chunk)
         else:
             file_paths = [temp_file_path]
-            logger.info(f"Processing single file with {num_pages} pages (no chunking needed)")
+            logger.info("Processing single file with %s pages (no chunking needed)", num_pages)
+
+        include_ocr = processing_options.get('include_ocr', True)
+        include_images = processing_options.get('include_images', True)
+        enable_evaluation = processing_options.get('enable_evaluation', True)
+        
+        # Chunks flow through OCR -> extraction -> evaluation independently, so
+        # chunk i can be extracted as soon as its own OCR finishes instead of
+        # waiting for every chunk's OCR. Image rendering does not depend on OCR
+        # and runs alongside it. Blocking calls are bounded per blob.
+        chunk_semaphore = asyncio.Semaphore(CHUNK_CONCURRENCY)
+        # Base64 page images per chunk, released once the chunk's last GPT stage is done
+        chunk_images = {}
+        
+        async def run_blocking(func, *args, **kwargs):
+            async with chunk_semaphore:
+                return await asyncio.to_thread(func, *args, **kwargs)
+        
+        async def run_cpu_bound_chunk(func, *args, **kwargs):
+            async with chunk_semaphore:
+                return await run_cpu_bound(func, *args, **kwargs)
+        
+        async def ocr_chunk(i, file_path):
+            logger.info("Processing OCR for chunk %s/%s", i + 1, len(file_paths))
+            return await run_blocking(ai_ocr.run_ocr_processing, file_path, document, data_container, None, update_state=False)
+        
+        async def images_chunk(i, file_path):
+            # Page rendering and PNG encoding are CPU-bound, so they run in the process pool
+            temp_dir, imgs = await run_cpu_bound_chunk(ai_ocr.prepare_images, file_path)
+            temp_dirs.append(temp_dir)
+            chunk_images[i] = imgs
+            # The rendered pages are already base64-encoded in memory. Only the image dir goes:
+            # the downloaded PDF may still be read by this or another chunk's OCR
+            await asyncio.to_thread(cleanup_temp_resources, [temp_dir], [], None)
+        
+        async def extract_chunk(i, ocr_task, images_task):
+            try:
+                return await _extract_chunk(i, ocr_task, images_task)
+            finally:
+                if not enable_evaluation:
+                    chunk_images.pop(i, None)
+        
+        async def _extract_chunk(i, ocr_task, images_task):
+            ocr_text_for_extraction = (await ocr_task)[0] if ocr_task else ""
+            if images_task:
+                await images_task
+            imgs = chunk_images.get(i, [])
+            logger.info("Processing GPT extraction for chunk %s/%s", i + 1, len(file_paths))
+            
+            if not ocr_text_for_extraction and not imgs:
+                logger.error("No input provided to GPT extraction - both OCR text and images are empty!")
+                raise ValueError("Cannot perform GPT extraction without either OCR text or images")
+            
+            return await run_blocking(
+                ai_ocr.run_gpt_extraction,
+                ocr_text_for_extraction,
+                document['model_input']['model_prompt'],
+                document['model_input']['example_schema'],
+                imgs,
+                document,
+                data_container,
+                None,
+                update_state=False
+            )
+        
+        async def evaluate_chunk(i, extraction_task, images_task):
+            try:
+                extracted_data, _ = await extraction_task
+                if images_task:
+                    await images_task
+                return await run_blocking(
+                    ai_ocr.run_gpt_evaluation,
+                    chunk_images.get(i, []),
+                    extracted_data,
+                    document['model_input']['example_schema'],
+                    document,
+                    data_container,
+                    None,
+                    update_state=False
+                )
+            finally:
+                chunk_images.pop(i, None)
+        
+        ocr_tasks = [asyncio.create_task(ocr_chunk(i, fp)) for i, fp in enumerate(file_paths)] if include_ocr else [None] * len(file_paths)
+        image_tasks = [asyncio.create_task(images_chunk(i, fp)) for i, fp in enumerate(file_paths)] if include_images else [None] * len(file_paths)
+        extraction_tasks = [
+            asyncio.create_task(extract_chunk(i, ocr_tasks[i], image_tasks[i])) for i in range(len(file_paths))
+        ]
+        evaluation_tasks = [
+            asyncio.create_task(evaluate_chunk(i, extraction_tasks[i], image_tasks[i])) for i in range(len(file_paths))
+        ] if enable_evaluation else []
+        pipeline_tasks = [task for task in ocr_tasks + image_tasks + extraction_tasks + evaluation_tasks if task]
 
         # Step 1: Run OCR for all files (conditional - only if OCR text will be used)
         ocr_results = []
         total_ocr_time = 0
         
-        if processing_options.get('include_ocr', True):
-            logger.info(f"Starting OCR processing for {len(file_paths)} chunks")
-            for i, file_path in enumerate(file_paths):
-                logger.info(f"Processing OCR for chunk {i+1}/{len(file_paths)}")
-                ocr_result, ocr_time = run_ocr_processing(file_path, document, data_container, None, update_state=False)
+        if include_ocr:
+            logger.info("Starting OCR processing for %s chunks", len(file_paths))
+            for ocr_result, ocr_time in await asyncio.gather(*ocr_tasks):
                 ocr_results.append(ocr_result)
                 total_ocr_time += ocr_time
                 
             processing_times['ocr_processing_time'] = total_ocr_time
-            document['extracted_data']['ocr_output'] = '\n'.join(str(result) for result in ocr_results)
-            update_state(document, data_container, 'ocr_completed', True, total_ocr_time)
-            data_container.upsert_item(document)
-            logger.info(f"Completed OCR processing for all chunks in {total_ocr_time:.2f}s")
+            combined_ocr_text = '\n'.join(str(result) for result in ocr_results)
+            document['extracted_data']['ocr_output'] = combined_ocr_text
+            await asyncio.to_thread(patch_document_state, document, data_container, 'ocr_completed', True, total_ocr_time)
+            logger.info("Completed OCR processing for all chunks in %.2fs", total_ocr_time)
         else:
             logger.info("Skipping OCR processing (OCR text not needed for GPT extraction)")
-            ocr_results = [""] * len(file_paths)
+            combined_ocr_text = ""
             processing_times['ocr_processing_time'] = 0
             document['extracted_data']['ocr_output'] = ""
-            update_state(document, data_container, 'ocr_skipped', True, 0)
-            data_container.upsert_item(document)
+            # Skipped steps have no progress to show, so the next write persists their state
+            _set_document_state(document, 'ocr_skipped', True, 0)
 
         # Step 2: GPT extraction
-        logger.info(f"Starting GPT extraction for {len(file_paths)} chunks")
+        logger.info("Starting GPT extraction for %s chunks", len(file_paths))
         extracted_data_list = []
         total_extraction_time = 0
-        image_cache = {}
         
-        for i, file_path in enumerate(file_paths):
-            logger.info(f"Processing GPT extraction for chunk {i+1}/{len(file_paths)}")
-            
-            if processing_options.get('include_images', True):
-                temp_dir, imgs = prepare_images(file_path, Config())
-                temp_dirs.append(temp_dir)
-                image_cache[i] = imgs
-            else:
-                imgs = []
-                image_cache[i] = []
-            
-            ocr_text_for_extraction = ocr_results[i] if processing_options.get('include_ocr', True) else ""
-            
-            if not ocr_text_for_extraction and not imgs:
-                logger.error("No input provided to GPT extraction - both OCR text and images are empty!")
-                raise ValueError("Cannot perform GPT extraction without either OCR text or images")
-            
-            extracted_data, extraction_time = run_gpt_extraction(
-                ocr_text_for_extraction,
-                document['model_input']['model_prompt'],
-                document['model_input']['example_schema'],
-                imgs,
-                document,
-                data_container,
-                None,
-                update_state=False
-            )
+        for extracted_data, extraction_time in await asyncio.gather(*extraction_tasks):
             extracted_data_list.append(extracted_data)
             total_extraction_time += extraction_time
 
@@ -375,26 +617,15 @@ def process_blob(blob_input_stream: BlobInputStream, data_container):
             structured_extraction = extracted_data_list[0] if extracted_data_list else {}
             
         document['extracted_data']['gpt_extraction_output'] = structured_extraction
-        update_state(document, data_container, 'gpt_extraction_completed', True, total_extraction_time)
-        data_container.upsert_item(document)
+        await asyncio.to_thread(patch_document_state, document, data_container, 'gpt_extraction_completed', True, total_extraction_time)
 
         # Step 3: GPT evaluation (conditional)
         total_evaluation_time = 0
-        if processing_options.get('enable_evaluation', True):
-            logger.info(f"Starting GPT evaluation for {len(file_paths)} chunks")
+        if enable_evaluation:
+            logger.info("Starting GPT evaluation for %s chunks", len(file_paths))
             evaluation_results = []
-            for i, file_path in enumerate(file_paths):
-                imgs = image_cache.get(i, [])
-                
-                enriched_data, evaluation_time = run_gpt_evaluation(
-                    imgs,
-                    extracted_data_list[i],
-                    document['model_input']['example_schema'],
-                    document,
-                    data_container,
-                    None,
-                    update_state=False
-                )
+            
+            for enriched_data, evaluation_time in await asyncio.gather(*evaluation_tasks):
                 evaluation_results.append(enriched_data)
                 total_evaluation_time += evaluation_time
 
@@ -408,39 +639,42 @@ def process_blob(blob_input_stream: BlobInputStream, data_container):
                 structured_evaluation = evaluation_results[0] if evaluation_results else {}
                 
             document['extracted_data']['gpt_extraction_output_with_evaluation'] = structured_evaluation
-            update_state(document, data_container, 'gpt_evaluation_completed', True, total_evaluation_time)
+            await asyncio.to_thread(patch_document_state, document, data_container, 'gpt_evaluation_completed', True, total_evaluation_time)
         else:
             structured_evaluation = {}
             document['extracted_data']['gpt_extraction_output_with_evaluation'] = structured_evaluation
-            update_state(document, data_container, 'gpt_evaluation_skipped', True, 0)
+            _set_document_state(document, 'gpt_evaluation_skipped', True, 0)
             processing_times['gpt_evaluation_time'] = 0
 
         # Step 4: Summary (conditional)
-        summary_time = 0
         if processing_options.get('enable_summary', True):
             logger.info("Starting GPT summary processing")
-            combined_ocr_text = '\n'.join(str(result) for result in ocr_results)
-            summary_data, summary_time = run_gpt_summary(combined_ocr_text, document, data_container, None, update_state=False)
+            summary_data, summary_time = await asyncio.to_thread(
+                ai_ocr.run_gpt_summary, combined_ocr_text, document, data_container, None, update_state=False
+            )
             
             document['extracted_data']['classification'] = summary_data['classification']
             document['extracted_data']['gpt_summary_output'] = summary_data['gpt_summary_output']
-            update_state(document, data_container, 'gpt_summary_completed', True, summary_time)
+            # The final upsert follows immediately and carries this state with it
+            _set_document_state(document, 'gpt_summary_completed', True, summary_time)
         else:
             document['extracted_data']['classification'] = ""
             document['extracted_data']['gpt_summary_output'] = ""
-            update_state(document, data_container, 'gpt_summary_skipped', True, 0)
+            _set_document_state(document, 'gpt_summary_skipped', True, 0)
         
         # Final update
-        overall_end_time = datetime.now()
-        total_processing_time = (overall_end_time - overall_start_time).total_seconds()
+        total_processing_time = time.perf_counter() - overall_start_time
         
-        logger.info(f"Processing completed for {blob_input_stream.name}")
-        logger.info(f"Total time: {total_processing_time:.2f}s | OCR: {processing_times['ocr_processing_time']:.2f}s | "
-                   f"Extraction: {processing_times['gpt_extraction_time']:.2f}s | "
-                   f"Evaluation: {processing_times.get('gpt_evaluation_time', 0):.2f}s | Summary: {summary_time:.2f}s")
+        logger.info("Processing completed for %s", blob_input_stream.name)
+        logger.info("Total time: %.2fs | OCR: %.2fs | Extraction: %.2fs | Evaluation: %.2fs | Summary: %.2fs",
+                    total_processing_time, processing_times['ocr_processing_time'],
+                    processing_times['gpt_extraction_time'], processing_times.get('gpt_evaluation_time', 0), summary_time)
         
-        update_final_document(document, document['extracted_data']['gpt_extraction_output'], ocr_results, 
-                            document['extracted_data']['gpt_extraction_output_with_evaluation'], processing_times, data_container)
+        await asyncio.to_thread(
+            update_final_document, document, document['extracted_data']['gpt_extraction_output'], combined_ocr_text,
+            document['extracted_data']['gpt_extraction_output_with_evaluation'], processing_times, data_container,
+            request_started
+        )
         
         return document
         
@@ -451,18 +685,22 @@ def process_blob(blob_input_stream: BlobInputStream, data_container):
         
         # Mark incomplete steps as failed
         if processing_options.get('include_ocr', True) and 'ocr_processing_time' not in processing_times:
-            update_state(document, data_container, 'ocr_completed', False)
+            _set_document_state(document, 'ocr_completed', False)
         if 'gpt_extraction_time' not in processing_times:
-            update_state(document, data_container, 'gpt_extraction_completed', False)
+            _set_document_state(document, 'gpt_extraction_completed', False)
         if processing_options.get('enable_evaluation', True) and 'gpt_evaluation_time' not in processing_times:
-            update_state(document, data_container, 'gpt_evaluation_completed', False)
+            _set_document_state(document, 'gpt_evaluation_completed', False)
         if processing_options.get('enable_summary', True) and summary_time == 0:
-            update_state(document, data_container, 'gpt_summary_completed', False)
+            _set_document_state(document, 'gpt_summary_completed', False)
         
-        data_container.upsert_item(document)
+        await asyncio.to_thread(data_container.upsert_item, document)
         raise e
     finally:
-        cleanup_temp_resources(temp_dirs, file_paths, temp_file_path)
+        # Let in-flight chunk work settle so every temp dir it created is cleaned up
+        await asyncio.gather(*pipeline_tasks, return_exceptions=True)
+        # Deleting rendered pages is off the critical path, so don't hold the
+        # processing semaphore for it
+        schedule_temp_cleanup(temp_dirs, file_paths, temp_file_path)
 
 
 def create_page_range_structure(data_list, file_paths, max_pages_per_chunk):
@@ -489,21 +727,13 @@ def create_page_range_structure(data_list, file_paths, max_pages_per_chunk):
     
     for i, (data, file_path) in enumerate(zip(data_list, file_paths)):
         # Parse page range from file_path if it contains subset information
-        if "_subset_" in file_path:
-            # Format: originalfile_subset_0_9.pdf -> pages_1-10
-            parts = file_path.split("_subset_")
-            if len(parts) == 2:
-                page_part = parts[1].replace(".pdf", "")
-                start_end = page_part.split("_")
-                if len(start_end) == 2:
-                    try:
-                        start_page = int(start_end[0]) + 1  # Convert to 1-indexed
-                        end_page = int(start_end[1]) + 1    # Convert to 1-indexed
-                        page_key = f"pages_{start_page}-{end_page}"
-                        structured_data[page_key] = data
-                        continue
-                    except ValueError:
-                        pass
+        # Format: originalfile_subset_0_9.pdf -> pages_1-10
+        match = _SUBSET_RE.search(file_path)
+        if match:
+            start_page = int(match.group(1)) + 1  # Convert to 1-indexed
+            end_page = int(match.group(2)) + 1    # Convert to 1-indexed
+            structured_data[f"pages_{start_page}-{end_page}"] = data
+            continue
         
         # Fallback: calculate page range from chunk index and max_pages_per_chunk
         chunk_start = i * max_pages_per_chunk + 1
@@ -514,13 +744,5 @@ def create_page_range_structure(data_list, file_paths, max_pages_per_chunk):
     return structured_data
 
 
-def create_page_range_evaluations(evaluation_list, file_paths, max_pages_per_chunk):
-    """
-    Create a structured JSON with page ranges for evaluations.
-    Uses the same logic as create_page_range_structure but for evaluation data.
-    
-    Returns:
-        Dict with page range keys like {"pages_1-10": {evaluation_data}, ...}
-    """
-    # Use the same logic as create_page_range_structure
-    return create_page_range_structure(evaluation_list, file_paths, max_pages_per_chunk)
+# Evaluations use the same page range structure as extractions
+create_page_range_evaluations = create_page_range_structure
@@ -2,21 +2,45 @@
 Azure client dependencies and global state management
 """
 import asyncio
+import collections
+import functools
 import logging
+import multiprocessing
 import os
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from azure.core.pipeline.transport import RequestsTransport
 from azure.storage.blob import BlobServiceClient
-from azure.identity import DefaultAzureCredential
 
 # Import your existing processing functions
-import sys
-sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'functionapp'))
-from ai_ocr.process import connect_to_cosmos
+from ai_ocr.azure.config import get_azure_credential, get_azure_openai_token_provider
 
 logger = logging.getLogger(__name__)
 
-# Azure credentials
-credential = DefaultAzureCredential()
+# Azure credentials (shared process-wide singleton)
+credential = get_azure_credential()
+
+# Blob transfer tuning: fetch small blobs in one GET and large ones in big
+# ranged chunks instead of the SDK's 32 MiB / 4 MiB defaults, and upload in
+# one PUT up to 64 MiB before falling back to 8 MiB staged blocks.
+# A parallel download buffers up to chunk size x max_concurrency per blob
+# (16 MiB x BLOB_TRANSFER_CONCURRENCY = 128 MiB), so lower these together
+# on memory-constrained replicas.
+BLOB_CLIENT_SETTINGS = {
+    "max_single_get_size": 64 * 1024 * 1024,
+    "max_chunk_get_size": 16 * 1024 * 1024,
+    "max_single_put_size": 64 * 1024 * 1024,
+    "max_block_size": 8 * 1024 * 1024,
+}
+
+# Connections kept alive per host by the HTTP pool shared across the Azure SDK clients
+HTTP_POOL_SIZE = 32
+
+# Shared requests session and SDK transport so blob and ARM calls reuse one connection pool
+http_session = None
+http_transport = None
 
 # Global variables for Azure clients
 blob_service_client = None
@@ -24,41 +48,188 @@ data_container = None
 conf_container = None
 logic_app_manager = None
 
+# Storage account blob hosts (besides the configured account) that blob URLs may name,
+# e.g. "otheraccount.blob.core.windows.net"; the managed identity token is only sent to these
+ALLOWED_BLOB_HOSTS = frozenset(
+    host.strip().lower() for host in os.getenv('ALLOWED_BLOB_HOSTS', '').split(',') if host.strip()
+)
+
 # Global thread pool executor for parallel processing
 global_executor = None
+global_executor_workers = 0
+
+# Fixed thread pool size, overriding the sizing derived from Logic App concurrency
+WORKER_THREADS = int(os.getenv('WORKER_THREADS', '0'))
+
+# Process pool for CPU-bound PDF splitting and page rendering, which would hold the GIL in threads
+global_process_executor = None
+
+# Fixed process pool size; 0 uses up to 2 of the CPUs this process may run on.
+# Every worker re-imports the PDF/imaging stack, so keep it small on 1 vCPU / 2Gi replicas
+PROCESS_WORKERS = int(os.getenv('PROCESS_WORKERS', '0'))
 
 # Global semaphore for concurrency control based on Logic App settings
 global_processing_semaphore = None
 
+# Concurrent document runs assumed until the Logic App settings are known
+DEFAULT_MAX_RUNS = 5
+
+
+class ResizableSemaphore:
+    """
+    FIFO asyncio semaphore whose permit count can change while it is in use.
+    
+    Shrinking never interrupts current holders; new acquirers simply wait until
+    enough permits have been released to fit under the new limit.
+    """
+    
+    def __init__(self, permits: int):
+        self._permits = permits
+        self._in_use = 0
+        self._waiters = collections.deque()
+    
+    @property
+    def permits(self) -> int:
+        return self._permits
+    
+    def locked(self) -> bool:
+        return self._in_use >= self._permits or bool(self._waiters)
+    
+    async def acquire(self) -> bool:
+        if not self.locked():
+            self._in_use += 1
+            return True
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # The permit was granted just before cancellation, pass it on
+                self.release()
+            elif waiter in self._waiters:
+                # _wake_waiters may already have popped and skipped the cancelled waiter
+                self._waiters.remove(waiter)
+            raise
+        return True
+    
+    def release(self):
+        if self._in_use <= 0:
+            raise ValueError("ResizableSemaphore released too many times")
+        self._in_use -= 1
+        self._wake_waiters()
+    
+    def resize(self, permits: int):
+        self._permits = permits
+        self._wake_waiters()
+    
+    def _wake_waiters(self):
+        # Permits are handed over in arrival order, so waiters cannot be overtaken
+        while self._waiters and self._in_use < self._permits:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self._in_use += 1
+                waiter.set_result(True)
+    
+    async def __aenter__(self):
+        await self.acquire()
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        self.release()
+
+
+def resize_global_executor(max_runs: int):
+    """Size the global thread pool for max_runs concurrent documents and install it as the loop's default executor"""
+    global global_executor, global_executor_workers
+    # The pool mostly waits on Cosmos, blob and OCR/OpenAI HTTP calls, so allow
+    # two threads per processing permit within sane bounds, and never fewer than
+    # the CPUs available for the PDF splitting and page rendering it also runs
+    workers = WORKER_THREADS or max(4, os.cpu_count() or 1, min(32, max_runs * 2))
+    if global_executor is not None and workers == global_executor_workers:
+        return
+    previous_executor = global_executor
+    global_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="argus")
+    global_executor_workers = workers
+    # Use it as the loop's default executor so asyncio.to_thread calls share it
+    asyncio.get_running_loop().set_default_executor(global_executor)
+    if previous_executor is not None:
+        # Work already queued on the old pool still runs to completion
+        previous_executor.shutdown(wait=False)
+    logger.info(f"Global ThreadPoolExecutor sized to {workers} workers for {max_runs} concurrent runs")
+
+
+def _process_pool_size() -> int:
+    """Number of worker processes for the CPU-bound process pool"""
+    if PROCESS_WORKERS > 0:
+        return PROCESS_WORKERS
+    # Honour CPU affinity where the platform exposes it
+    available_cpus = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count() or 1
+    return max(1, min(2, available_cpus))
+
+
+def get_http_transport():
+    """Get the HTTP transport shared by the Azure SDK clients, creating it on first use"""
+    global http_session, http_transport
+    if http_transport is None:
+        http_session = requests.Session()
+        # Retries are handled by the SDK retry policies, so urllib3 must not retry on its own
+        adapter = HTTPAdapter(
+            pool_connections=HTTP_POOL_SIZE,
+            pool_maxsize=HTTP_POOL_SIZE,
+            max_retries=Retry(total=False, redirect=False, raise_on_status=False)
+        )
+        http_session.mount('https://', adapter)
+        http_session.mount('http://', adapter)
+        # session_owner=False keeps one client's close() from closing the pool under the others;
+        # timeouts are the Storage SDK defaults, the block size suits whole-PDF downloads
+        http_transport = RequestsTransport(
+            session=http_session,
+            session_owner=False,
+            connection_timeout=20,
+            read_timeout=60,
+            connection_data_block_size=1024 * 1024
+        )
+    return http_transport
+
+
+async def _apply_logic_app_concurrency():
+    """Size the processing semaphore and thread pool from the current Logic App concurrency"""
+    if not logic_app_manager.enabled:
+        return
+    try:
+        settings = await logic_app_manager.get_concurrency_settings()
+        if settings.get('enabled'):
+            max_runs = settings.get('current_max_runs', 1)
+            global_processing_semaphore.resize(max_runs)
+            logger.info(f"Updated processing semaphore to {max_runs} permits based on Logic App settings")
+            resize_global_executor(max_runs)
+    except Exception as e:
+        logger.warning(f"Could not retrieve Logic App concurrency settings on startup: {e}")
+
 
 async def initialize_azure_clients():
     """Initialize Azure clients on startup"""
-    global blob_service_client, data_container, conf_container, global_executor, logic_app_manager, global_processing_semaphore
+    global blob_service_client, data_container, conf_container, logic_app_manager, global_processing_semaphore
+    global global_process_executor
     
     try:
-        # Initialize global thread pool executor
-        global_executor = ThreadPoolExecutor(max_workers=10)
-        logger.info("Initialized global ThreadPoolExecutor with 10 workers")
+        # Initialize global thread pool executor for the default concurrency
+        resize_global_executor(DEFAULT_MAX_RUNS)
+        
+        # spawn avoids forking a process that already runs threads
+        global_process_executor = ProcessPoolExecutor(
+            max_workers=_process_pool_size(),
+            mp_context=multiprocessing.get_context('spawn')
+        )
         
-        # Initialize processing semaphore with default concurrency of 5
+        # Initialize processing semaphore with default concurrency
         # This will be updated when Logic App concurrency settings are retrieved
-        global_processing_semaphore = asyncio.Semaphore(5)
-        logger.info("Initialized global processing semaphore with 5 permits")
+        global_processing_semaphore = ResizableSemaphore(DEFAULT_MAX_RUNS)
+        logger.info(f"Initialized global processing semaphore with {DEFAULT_MAX_RUNS} permits")
         
         # Initialize Logic App Manager
         from logic_app_manager import LogicAppManager
-        logic_app_manager = LogicAppManager()
-        
-        # Try to get current Logic App concurrency to set proper semaphore value
-        if logic_app_manager.enabled:
-            try:
-                settings = await logic_app_manager.get_concurrency_settings()
-                if settings.get('enabled'):
-                    max_runs = settings.get('current_max_runs', 1)
-                    global_processing_semaphore = asyncio.Semaphore(max_runs)
-                    logger.info(f"Updated processing semaphore to {max_runs} permits based on Logic App settings")
-            except Exception as e:
-                logger.warning(f"Could not retrieve Logic App concurrency settings on startup: {e}")
+        logic_app_manager = LogicAppManager(credential=credential, transport=get_http_transport())
         
         # Initialize blob service client
         storage_account_url = os.getenv('BLOB_ACCOUNT_URL')
@@ -71,11 +242,18 @@ async def initialize_azure_clients():
         
         blob_service_client = BlobServiceClient(
             account_url=storage_account_url,
-            credential=credential
+            credential=credential,
+            transport=get_http_transport(),
+            **BLOB_CLIENT_SETTINGS
         )
         
-        # Initialize Cosmos DB containers
-        data_container, conf_container = connect_to_cosmos()
+        # The Logic App settings lookup and the Cosmos DB bootstrap are independent
+        # network round trips, so run them concurrently
+        from ai_ocr.process import connect_to_cosmos
+        _, (data_container, conf_container) = await asyncio.gather(
+            _apply_logic_app_concurrency(),
+            asyncio.to_thread(connect_to_cosmos)
+        )
         
         logger.info("Successfully initialized Azure clients")
         
@@ -84,21 +262,83 @@ async def initialize_azure_clients():
         raise
 
 
+async def warm_up_azure_clients():
+    """Open the Storage and Cosmos DB connections and fetch the OpenAI token before the first request needs them"""
+    warmups = []
+    if os.getenv('AZURE_OPENAI_ENDPOINT'):
+        # Storage, Cosmos DB and ARM tokens are fetched by the calls below and at startup;
+        # the Cognitive Services token would otherwise wait for the first GPT call
+        warmups.append(asyncio.to_thread(get_azure_openai_token_provider()))
+    if blob_service_client is not None:
+        container_client = blob_service_client.get_container_client(os.getenv('CONTAINER_NAME', 'datasets'))
+        warmups.append(asyncio.to_thread(container_client.get_container_properties))
+    for container in (data_container, conf_container):
+        if container is not None:
+            warmups.append(asyncio.to_thread(container.read))
+    
+    # A failed warm-up only means the first real request pays the handshake
+    results = await asyncio.gather(*warmups, return_exceptions=True)
+    for result in results:
+        if isinstance(result, Exception):
+            logger.warning(f"Azure client warm-up request failed: {result}")
+
+
 async def cleanup_azure_clients():
     """Cleanup Azure clients on shutdown"""
-    global global_executor
+    global global_executor, http_session, http_transport
     
+    if logic_app_manager:
+        logic_app_manager.close()
+    if http_session:
+        http_session.close()
+        http_session = None
+        http_transport = None
+    if global_process_executor:
+        logger.info("Shutting down global ProcessPoolExecutor")
+        global_process_executor.shutdown(wait=True, cancel_futures=True)
     if global_executor:
         logger.info("Shutting down global ThreadPoolExecutor")
         global_executor.shutdown(wait=True)
     logger.info("Shutting down application")
 
 
+def get_credential():
+    """Get the shared Azure credential"""
+    return credential
+
+
 def get_blob_service_client():
     """Get the global blob service client"""
     return blob_service_client
 
 
+def get_blob_service_client_for_host(account_host: str):
+    """
+    Get the blob service client for a storage account host named in a blob URL.
+    
+    Only the configured storage account and hosts listed in ALLOWED_BLOB_HOSTS are
+    accepted, since the client authenticates with the shared managed identity;
+    any other host raises ValueError.
+    """
+    host = (account_host or '').lower()
+    if blob_service_client is not None and host == blob_service_client.primary_hostname.lower():
+        return blob_service_client
+    if host not in ALLOWED_BLOB_HOSTS:
+        raise ValueError(f"Blob URL host is not an allowed storage account: {account_host}")
+    return _get_account_blob_service_client(host)
+
+
+@functools.lru_cache(maxsize=8)
+def _get_account_blob_service_client(account_host: str):
+    """Create a blob service client for an allowed extra storage account, cached per host"""
+    return BlobServiceClient(
+        account_url=f"https://{account_host}",
+        credential=credential,
+        transport=get_http_transport(),
+        **BLOB_CLIENT_SETTINGS
+    )
+
+
 def get_data_container():
     """Get the global data container"""
     return data_container
@@ -119,12 +359,18 @@ def get_global_executor():
     return global_executor
 
 
+def get_global_process_executor():
+    """Get the global process pool executor for CPU-bound work"""
+    return global_process_executor
+
+
 def get_global_processing_semaphore():
     """Get the global processing semaphore"""
     return global_processing_semaphore
 
 
-def set_global_processing_semaphore(semaphore):
-    """Set the global processing semaphore"""
-    global global_processing_semaphore
-    global_processing_semaphore = semaphore
+def resize_global_processing_semaphore(permits: int):
+    """Change the permit count of the global processing semaphore in place"""
+    if global_processing_semaphore is None:
+        raise RuntimeError("Global processing semaphore is not initialized")
+    global_processing_semaphore.resize(permits)
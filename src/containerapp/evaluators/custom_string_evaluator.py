@@ -1,3 +1,5 @@
+import re
+
 from src.evaluators.field_evaluator_base import FieldEvaluatorBase
 
 class CustomStringEvaluator(FieldEvaluatorBase):
@@ -10,9 +12,36 @@ class CustomStringEvaluator(FieldEvaluatorBase):
         IGNORE_PARENTHETHES = "IGNORE_PARENTHETHES"
         IGNORE_DASHES = "IGNORE_DASHES"
 
+    # Characters removed from both strings for each IGNORE_* flag
+    IGNORED_CHARS = {
+        Config.IGNORE_DOTS: '.',
+        Config.IGNORE_COMMAS: ',',
+        Config.IGNORE_DASHES: '-',
+        Config.IGNORE_PARENTHETHES: '()',
+    }
+
+    # Compiled strip patterns keyed by the set of ignored characters
+    _pattern_cache = {}
+
     def __init__(self, default_config = {}) -> None:
         self.default_config = default_config
 
+    def _ignored_chars(self, config: dict) -> frozenset:
+        chars = set()
+        for flag, flag_chars in self.IGNORED_CHARS.items():
+            if config.get(flag, False):
+                chars.update(flag_chars)
+        return frozenset(chars)
+
+    @classmethod
+    def _get_strip_pattern(cls, chars: frozenset):
+        pattern = cls._pattern_cache.get(chars)
+        if pattern is None:
+            # One character class strips every ignored character in a single pass
+            pattern = re.compile('[' + re.escape(''.join(sorted(chars))) + ']')
+            cls._pattern_cache[chars] = pattern
+        return pattern
+
     def __call__(self, ground_truth: str, actual: str, config: dict = None):
         if not config:
             config = self.default_config
@@ -20,23 +49,11 @@ class CustomStringEvaluator(FieldEvaluatorBase):
         actual_processed = str(actual).lower()
         ground_truth_processed = str(ground_truth).lower()
 
-        if config.get(self.Config.IGNORE_DOTS, False):
-            actual_processed = actual_processed.replace('.', '')
-            ground_truth_processed = ground_truth_processed.replace('.', '')
-
-        if config.get(self.Config.IGNORE_COMMAS, False):
-            actual_processed = actual_processed.replace(',', '')
-            ground_truth_processed = ground_truth_processed.replace(',', '')
-
-        if config.get(self.Config.IGNORE_DASHES, False):
-            actual_processed = actual_processed.replace('-', '')
-            ground_truth_processed = ground_truth_processed.replace('-', '')
-        
-        if config.get(self.Config.IGNORE_PARENTHETHES, False):
-            actual_processed = actual_processed.replace('(', '')
-            ground_truth_processed = ground_truth_processed.replace('(', '')
-            actual_processed = actual_processed.replace(')', '')
-            ground_truth_processed = ground_truth_processed.replace(')', '')
+        ignored_chars = self._ignored_chars(config)
+        if ignored_chars:
+            pattern = self._get_strip_pattern(ignored_chars)
+            actual_processed = pattern.sub('', actual_processed)
+            ground_truth_processed = pattern.sub('', ground_truth_processed)
 
         if config.get(self.Config.IGNORE_DOLLAR_SIGN, False):
             # Remove leading dollar signs from both strings
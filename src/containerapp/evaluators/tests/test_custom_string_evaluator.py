@@ -1,111 +1,42 @@
-import unittest
+import pytest
 
 from src.evaluators.custom_string_evaluator import CustomStringEvaluator
 
 
-class TestCustomStringEvaluator(unittest.TestCase):
-
-    def test_string_evaluator_exact_match(
-        self
-    ):
-        evaluator = CustomStringEvaluator()
-        exact_match = evaluator("value", "value")
-        no_match = evaluator("value", "not_value")
-        assert exact_match == True
-        assert no_match == False
-
-    def test_string_evaluator_commas_ignored(
-        self
-    ):
-        evaluator = CustomStringEvaluator()
-        match_1 = evaluator("value", "va,lue",config={CustomStringEvaluator.Config.IGNORE_COMMAS: True})
-        assert match_1 == True
-
-
-    def test_string_evaluator_commas_not_ignored(
-        self
-    ):
-        evaluator = CustomStringEvaluator()
-        match_1 = evaluator("value", "value", config={CustomStringEvaluator.Config.IGNORE_COMMAS: False})
-        match_2 = evaluator("value", "va,lue", config={CustomStringEvaluator.Config.IGNORE_COMMAS: False})
-        assert match_1 == True
-        assert match_2 == False
-
-
-    def test_string_evaluator_dots_ignored(
-        self
-    ):
-        evaluator = CustomStringEvaluator()
-        match_1 = evaluator("value", "va.lue",config={CustomStringEvaluator.Config.IGNORE_DOTS: True})
-        assert match_1 == True
-
-
-    def test_string_evaluator_dots_not_ignored(
-        self
-    ):
-        evaluator = CustomStringEvaluator()
-        match_1 = evaluator("value", "value",config={CustomStringEvaluator.Config.IGNORE_DOTS: False})
-        match_2 = evaluator("value", "va.lue",config={CustomStringEvaluator.Config.IGNORE_DOTS: False})
-        assert match_1 == True
-        assert match_2 == False
-
-
-    def test_string_evaluator_dollar_sign_ignored(
-        self
-    ):
-        evaluator = CustomStringEvaluator()
-        match_1 = evaluator("$10", "10",config={CustomStringEvaluator.Config.IGNORE_DOLLAR_SIGN: True})
-        assert match_1 == True
-
-
-    def test_string_evaluator_dollar_sign_not_ignored(
-        self
-    ):
-        evaluator = CustomStringEvaluator()
-        match_1 = evaluator("$10", "10",config={CustomStringEvaluator.Config.IGNORE_DOLLAR_SIGN: False})
-        assert match_1 == False
-
-    
-
-    def test_string_evaluator_parenthesis_ignored(
-        self
-    ):
-        evaluator = CustomStringEvaluator()
-        match_1 = evaluator("(256)3300488", "2563300488",config={CustomStringEvaluator.Config.IGNORE_PARENTHETHES: True})
-        assert match_1 == True
-
-
-    def test_string_evaluator_parenthesis_not_ignored(
-        self
-    ):
-        evaluator = CustomStringEvaluator()
-        match_1 = evaluator("(256)3300488", "2563300488",config={CustomStringEvaluator.Config.IGNORE_PARENTHETHES: False})
-        assert match_1 == False
-
-    def test_string_evaluator_dashes_ignored(
-        self
-    ):
-        evaluator = CustomStringEvaluator()
-        match_1 = evaluator("(256)330-0488", "(256)3300488",config={CustomStringEvaluator.Config.IGNORE_DASHES: True})
-        assert match_1 == True
-
-
-    def test_string_evaluator_dashes_not_ignored(
-        self
-    ):
-        evaluator = CustomStringEvaluator()
-        match_1 = evaluator("(256)3300-488", "(256)3300488",config={CustomStringEvaluator.Config.IGNORE_DASHES: False})
-        assert match_1 == False
-
-    def test_string_evaluator_additional_matches(
-        self
-    ):
-        evaluator = CustomStringEvaluator()
-        match_1 = evaluator("correct", "correct",config={CustomStringEvaluator.Config.ADDITIONAL_MATCHES: ["yes", "true"]})
-        match_2 = evaluator("correct", "yes", config={CustomStringEvaluator.Config.ADDITIONAL_MATCHES: ["yes", "true"]})
-        match_3 = evaluator("correct", "true", config={CustomStringEvaluator.Config.ADDITIONAL_MATCHES: ["yes", "true"]})
-        match_4 = evaluator("correct", "false", config={CustomStringEvaluator.Config.ADDITIONAL_MATCHES: ["yes", "true"]})
-        assert match_1 == True
-        assert match_2 == True
-        assert match_3 == True
-        assert match_4 == False
+evaluator = CustomStringEvaluator()
+
+Config = CustomStringEvaluator.Config
+
+
+@pytest.mark.parametrize(
+    "expected,a,b,config",
+    [
+        # exact match
+        (True, "value", "value", None),
+        (False, "value", "not_value", None),
+        # commas
+        (True, "value", "va,lue", {Config.IGNORE_COMMAS: True}),
+        (True, "value", "value", {Config.IGNORE_COMMAS: False}),
+        (False, "value", "va,lue", {Config.IGNORE_COMMAS: False}),
+        # dots
+        (True, "value", "va.lue", {Config.IGNORE_DOTS: True}),
+        (True, "value", "value", {Config.IGNORE_DOTS: False}),
+        (False, "value", "va.lue", {Config.IGNORE_DOTS: False}),
+        # dollar sign
+        (True, "$10", "10", {Config.IGNORE_DOLLAR_SIGN: True}),
+        (False, "$10", "10", {Config.IGNORE_DOLLAR_SIGN: False}),
+        # parentheses
+        (True, "(256)3300488", "2563300488", {Config.IGNORE_PARENTHETHES: True}),
+        (False, "(256)3300488", "2563300488", {Config.IGNORE_PARENTHETHES: False}),
+        # dashes
+        (True, "(256)330-0488", "(256)3300488", {Config.IGNORE_DASHES: True}),
+        (False, "(256)3300-488", "(256)3300488", {Config.IGNORE_DASHES: False}),
+        # additional matches
+        (True, "correct", "correct", {Config.ADDITIONAL_MATCHES: ["yes", "true"]}),
+        (True, "correct", "yes", {Config.ADDITIONAL_MATCHES: ["yes", "true"]}),
+        (True, "correct", "true", {Config.ADDITIONAL_MATCHES: ["yes", "true"]}),
+        (False, "correct", "false", {Config.ADDITIONAL_MATCHES: ["yes", "true"]}),
+    ],
+)
+def test_evaluator(expected, a, b, config):
+    assert evaluator(a, b, config=config) == expected
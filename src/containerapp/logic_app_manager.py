@@ -1,24 +1,94 @@
 """
 Logic App Manager for Azure Logic App concurrency management
 """
+import asyncio
 import logging
 import os
+import time
 from datetime import datetime
-from typing import Dict, Any
-from azure.identity import DefaultAzureCredential
+from typing import Dict, Any, Optional
+from azure.core.credentials import TokenCredential
+from azure.core.pipeline.transport import HttpTransport
 from azure.mgmt.logic import LogicManagementClient
 
+from ai_ocr.azure.config import get_azure_credential
+
 logger = logging.getLogger(__name__)
 
+# How long a fetched workflow is reused for concurrency reads and no-op update checks
+WORKFLOW_CACHE_TTL_SECONDS = 30
+
+# Concurrency updates arriving within this window share one workflow GET and PUT
+UPDATE_COALESCE_SECONDS = 0.25
+
+
+def _apply_trigger_concurrency(definition: Dict[str, Any], max_runs: int) -> bool:
+    """Set trigger-level concurrency in a workflow definition, returning whether anything changed"""
+    changed = False
+    for trigger_name, trigger_config in definition.get('triggers', {}).items():
+        # Set runtime configuration for concurrency control
+        concurrency = trigger_config.setdefault('runtimeConfiguration', {}).setdefault('concurrency', {})
+        if concurrency.get('runs') != max_runs:
+            concurrency['runs'] = max_runs
+            changed = True
+            logger.info(f"Updated concurrency for trigger {trigger_name} to {max_runs}")
+    return changed
+
+
+def _apply_action_concurrency(definition: Dict[str, Any], max_runs: int) -> tuple[bool, int]:
+    """Set concurrency on HTTP actions and loops, returning whether anything changed and the action count"""
+    changed = False
+    updated_actions = 0
+    
+    # Walk nested actions in conditionals and loops with an explicit stack
+    pending_actions = [definition.get('actions', {})]
+    while pending_actions:
+        for action_name, action_config in pending_actions.pop().items():
+            action_type = action_config.get('type')
+            
+            # Set concurrency for HTTP actions
+            if action_type in ('Http', 'ApiConnection'):
+                concurrency = action_config.setdefault('runtimeConfiguration', {}).setdefault('concurrency', {})
+                if concurrency.get('runs') != max_runs:
+                    concurrency['runs'] = max_runs
+                    changed = True
+                logger.info(f"Updated action concurrency for {action_name} to {max_runs}")
+                updated_actions += 1
+            
+            # Handle foreach loops specifically
+            if action_type == 'Foreach':
+                concurrency = action_config.setdefault('runtimeConfiguration', {}).setdefault('concurrency', {})
+                if concurrency.get('repetitions') != max_runs:
+                    concurrency['repetitions'] = max_runs
+                    changed = True
+                logger.info(f"Updated foreach concurrency for {action_name} to {max_runs}")
+                updated_actions += 1
+            
+            # Queue nested actions in conditionals and loops
+            if 'actions' in action_config:
+                pending_actions.append(action_config['actions'])
+            if 'else' in action_config and 'actions' in action_config['else']:
+                pending_actions.append(action_config['else']['actions'])
+    
+    return changed, updated_actions
+
 
 class LogicAppManager:
     """Manages Logic App concurrency settings via Azure Management API"""
     
-    def __init__(self):
-        self.credential = DefaultAzureCredential()
+    def __init__(self, credential: Optional[TokenCredential] = None, transport: Optional[HttpTransport] = None):
+        # Share the process-wide credential so its token cache is reused across SDK clients
+        self.credential = credential or get_azure_credential()
+        # Optional shared HTTP transport so ARM calls reuse the app-wide connection pool
+        self.transport = transport
         self.subscription_id = os.getenv('AZURE_SUBSCRIPTION_ID')
         self.resource_group_name = os.getenv('AZURE_RESOURCE_GROUP_NAME')
         self.logic_app_name = os.getenv('LOGIC_APP_NAME')
+        self._logic_client: Optional[LogicManagementClient] = None
+        self._cached_workflow = None
+        self._cached_at = 0.0
+        self._pending_updates = []
+        self._flush_task: Optional[asyncio.Task] = None
         
         if not all([self.subscription_id, self.resource_group_name, self.logic_app_name]):
             logger.warning("Logic App management requires AZURE_SUBSCRIPTION_ID, AZURE_RESOURCE_GROUP_NAME, and LOGIC_APP_NAME environment variables")
@@ -28,10 +98,57 @@ class LogicAppManager:
             logger.info(f"Logic App Manager initialized for {self.logic_app_name} in {self.resource_group_name}")
     
     def get_logic_management_client(self):
-        """Create a Logic Management client"""
+        """Get the Logic Management client, creating it on first use"""
         if not self.enabled:
             raise ValueError("Logic App Manager is not properly configured")
-        return LogicManagementClient(self.credential, self.subscription_id)
+        if self._logic_client is None:
+            client_kwargs = {'transport': self.transport} if self.transport is not None else {}
+            self._logic_client = LogicManagementClient(self.credential, self.subscription_id, **client_kwargs)
+        return self._logic_client
+    
+    def close(self):
+        """Close the cached Logic Management client and its connection pool"""
+        if self._logic_client is not None:
+            self._logic_client.close()
+            self._logic_client = None
+    
+    async def _fetch_workflow(self):
+        """Fetch the current Logic App workflow from Azure Resource Manager"""
+        logic_client = self.get_logic_management_client()
+        return await asyncio.to_thread(
+            logic_client.workflows.get,
+            resource_group_name=self.resource_group_name,
+            workflow_name=self.logic_app_name
+        )
+    
+    def _get_fresh_cached_workflow(self):
+        """Get the cached workflow if it is younger than WORKFLOW_CACHE_TTL_SECONDS"""
+        if self._cached_workflow is not None and time.monotonic() - self._cached_at < WORKFLOW_CACHE_TTL_SECONDS:
+            return self._cached_workflow
+        return None
+    
+    async def _get_cached_workflow(self):
+        """Get the workflow for read-only use, fetching it when the cache is stale"""
+        workflow = self._get_fresh_cached_workflow()
+        if workflow is None:
+            workflow = await self._fetch_workflow()
+            self._cached_workflow = workflow
+            self._cached_at = time.monotonic()
+        return workflow
+    
+    def _invalidate_workflow_cache(self):
+        """Drop the cached workflow after it has been changed"""
+        self._cached_workflow = None
+    
+    def _unchanged_result(self, max_runs: int) -> Dict[str, Any]:
+        """Result for an update request that matches the current settings"""
+        logger.info(f"Logic App {self.logic_app_name} concurrency already set to {max_runs}, skipping update")
+        return {
+            "success": True,
+            "unchanged": True,
+            "logic_app_name": self.logic_app_name,
+            "new_max_runs": max_runs
+        }
     
     async def get_concurrency_settings(self) -> Dict[str, Any]:
         """Get current Logic App concurrency settings"""
@@ -39,13 +156,8 @@ class LogicAppManager:
             if not self.enabled:
                 return {"error": "Logic App Manager not configured", "enabled": False}
             
-            logic_client = self.get_logic_management_client()
-            
             # Get the Logic App workflow
-            workflow = logic_client.workflows.get(
-                resource_group_name=self.resource_group_name,
-                workflow_name=self.logic_app_name
-            )
+            workflow = await self._get_cached_workflow()
             
             # Extract concurrency settings from workflow definition
             definition = workflow.definition or {}
@@ -75,6 +187,93 @@ class LogicAppManager:
             logger.error(f"Error getting Logic App concurrency settings: {e}")
             return {"error": str(e), "enabled": False}
     
+    async def _submit_update(self, include_actions: bool, max_runs: int) -> Dict[str, Any]:
+        """Queue a concurrency update and wait for the batched write that applies it"""
+        result = asyncio.get_running_loop().create_future()
+        self._pending_updates.append((include_actions, max_runs, result))
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_updates())
+        return await result
+    
+    async def _flush_updates(self):
+        """
+        Apply every update queued during the coalescing window with one GET and one PUT.
+        
+        Updates are applied in arrival order, so when several requests touch the
+        same setting the last one wins.
+        """
+        await asyncio.sleep(UPDATE_COALESCE_SECONDS)
+        pending, self._pending_updates = self._pending_updates, []
+        self._flush_task = None
+        # The workflow is about to change, so stop answering no-op checks from the cache
+        self._invalidate_workflow_cache()
+        
+        try:
+            # Get the current workflow
+            current_workflow = await self._fetch_workflow()
+            
+            # Update the freshly fetched definition in place: it is either sent with the
+            # PUT and dropped, or left untouched (nothing changed) and cached for reads
+            updated_definition = current_workflow.definition or {}
+            applied = []
+            for include_actions, max_runs, _ in pending:
+                changed = _apply_trigger_concurrency(updated_definition, max_runs)
+                updated_actions = 0
+                if include_actions:
+                    actions_changed, updated_actions = _apply_action_concurrency(updated_definition, max_runs)
+                    changed = changed or actions_changed
+                applied.append((changed, updated_actions))
+            
+            if any(changed for changed, _ in applied):
+                # Create the workflow update request using the proper Workflow object
+                from azure.mgmt.logic.models import Workflow
+                
+                workflow_update = Workflow(
+                    location=current_workflow.location,
+                    definition=updated_definition,
+                    state=current_workflow.state,
+                    parameters=current_workflow.parameters,
+                    tags=current_workflow.tags  # Include tags to maintain existing metadata
+                )
+                
+                # Update the workflow
+                await asyncio.to_thread(
+                    self.get_logic_management_client().workflows.create_or_update,
+                    resource_group_name=self.resource_group_name,
+                    workflow_name=self.logic_app_name,
+                    workflow=workflow_update
+                )
+                self._invalidate_workflow_cache()
+                logger.info(f"Successfully applied {len(pending)} concurrency update(s) to Logic App {self.logic_app_name}")
+            else:
+                self._cached_workflow = current_workflow
+                self._cached_at = time.monotonic()
+            
+            updated_at = datetime.utcnow().isoformat()
+            triggers_count = len(updated_definition.get('triggers', {}))
+            for (include_actions, max_runs, result), (changed, updated_actions) in zip(pending, applied):
+                if result.done():
+                    continue
+                if not changed:
+                    result.set_result(self._unchanged_result(max_runs))
+                    continue
+                update_result = {
+                    "success": True,
+                    "logic_app_name": self.logic_app_name,
+                    "new_max_runs": max_runs,
+                    "updated_at": updated_at
+                }
+                if include_actions:
+                    update_result["updated_triggers"] = triggers_count
+                    update_result["updated_actions"] = updated_actions
+                result.set_result(update_result)
+        
+        except Exception as e:
+            self._invalidate_workflow_cache()
+            for _, _, result in pending:
+                if not result.done():
+                    result.set_exception(e)
+    
     async def update_concurrency_settings(self, max_runs: int) -> Dict[str, Any]:
         """Update Logic App concurrency settings"""
         try:
@@ -84,54 +283,18 @@ class LogicAppManager:
             if max_runs < 1 or max_runs > 100:
                 return {"error": "Max runs must be between 1 and 100", "success": False}
             
-            logic_client = self.get_logic_management_client()
-            
-            # Get the current workflow
-            current_workflow = logic_client.workflows.get(
-                resource_group_name=self.resource_group_name,
-                workflow_name=self.logic_app_name
-            )
+            # Resubmitting the value that was just read needs no ARM round trip,
+            # unless queued updates are about to change it
+            cached_workflow = self._get_fresh_cached_workflow()
+            if cached_workflow is not None and not self._pending_updates:
+                cached_triggers = (cached_workflow.definition or {}).get('triggers', {})
+                if cached_triggers and all(
+                    trigger_config.get('runtimeConfiguration', {}).get('concurrency', {}).get('runs') == max_runs
+                    for trigger_config in cached_triggers.values()
+                ):
+                    return self._unchanged_result(max_runs)
             
-            # Update the workflow definition with new concurrency settings
-            updated_definition = current_workflow.definition.copy() if current_workflow.definition else {}
-            
-            # Find the trigger and update its concurrency settings using runtimeConfiguration
-            triggers = updated_definition.get('triggers', {})
-            for trigger_name, trigger_config in triggers.items():
-                # Set runtime configuration for concurrency control
-                if 'runtimeConfiguration' not in trigger_config:
-                    trigger_config['runtimeConfiguration'] = {}
-                if 'concurrency' not in trigger_config['runtimeConfiguration']:
-                    trigger_config['runtimeConfiguration']['concurrency'] = {}
-                trigger_config['runtimeConfiguration']['concurrency']['runs'] = max_runs
-                logger.info(f"Updated concurrency for trigger {trigger_name} to {max_runs}")
-            
-            # Create the workflow update request using the proper Workflow object
-            from azure.mgmt.logic.models import Workflow
-            
-            workflow_update = Workflow(
-                location=current_workflow.location,
-                definition=updated_definition,
-                state=current_workflow.state,
-                parameters=current_workflow.parameters,
-                tags=current_workflow.tags  # Include tags to maintain existing metadata
-            )
-            
-            # Update the workflow
-            updated_workflow = logic_client.workflows.create_or_update(
-                resource_group_name=self.resource_group_name,
-                workflow_name=self.logic_app_name,
-                workflow=workflow_update
-            )
-            
-            logger.info(f"Successfully updated Logic App {self.logic_app_name} max concurrent runs to {max_runs}")
-            
-            return {
-                "success": True,
-                "logic_app_name": self.logic_app_name,
-                "new_max_runs": max_runs,
-                "updated_at": datetime.utcnow().isoformat()
-            }
+            return await self._submit_update(False, max_runs)
             
         except Exception as e:
             logger.error(f"Error updating Logic App concurrency settings: {e}")
@@ -143,13 +306,8 @@ class LogicAppManager:
             if not self.enabled:
                 return {"error": "Logic App Manager not configured", "enabled": False}
             
-            logic_client = self.get_logic_management_client()
-            
             # Get the Logic App workflow
-            workflow = logic_client.workflows.get(
-                resource_group_name=self.resource_group_name,
-                workflow_name=self.logic_app_name
-            )
+            workflow = await self._get_cached_workflow()
             
             return {
                 "enabled": True,
@@ -173,94 +331,7 @@ class LogicAppManager:
             if max_runs < 1 or max_runs > 100:
                 return {"error": "Max runs must be between 1 and 100", "success": False}
             
-            logic_client = self.get_logic_management_client()
-            
-            # Get the current workflow
-            current_workflow = logic_client.workflows.get(
-                resource_group_name=self.resource_group_name,
-                workflow_name=self.logic_app_name
-            )
-            
-            # Update the workflow definition with new concurrency settings
-            updated_definition = current_workflow.definition.copy() if current_workflow.definition else {}
-            
-            # Update trigger-level concurrency
-            triggers = updated_definition.get('triggers', {})
-            for trigger_name, trigger_config in triggers.items():
-                if 'runtimeConfiguration' not in trigger_config:
-                    trigger_config['runtimeConfiguration'] = {}
-                if 'concurrency' not in trigger_config['runtimeConfiguration']:
-                    trigger_config['runtimeConfiguration']['concurrency'] = {}
-                trigger_config['runtimeConfiguration']['concurrency']['runs'] = max_runs
-                logger.info(f"Updated trigger concurrency for {trigger_name} to {max_runs}")
-            
-            # Update action-level concurrency for HTTP actions and loops
-            actions = updated_definition.get('actions', {})
-            updated_actions = 0
-            
-            def update_action_concurrency(actions_dict):
-                nonlocal updated_actions
-                for action_name, action_config in actions_dict.items():
-                    # Set concurrency for HTTP actions
-                    if action_config.get('type') in ['Http', 'ApiConnection']:
-                        if 'runtimeConfiguration' not in action_config:
-                            action_config['runtimeConfiguration'] = {}
-                        if 'concurrency' not in action_config['runtimeConfiguration']:
-                            action_config['runtimeConfiguration']['concurrency'] = {}
-                        action_config['runtimeConfiguration']['concurrency']['runs'] = max_runs
-                        logger.info(f"Updated action concurrency for {action_name} to {max_runs}")
-                        updated_actions += 1
-                    
-                    # Handle nested actions in conditionals and loops
-                    if 'actions' in action_config:
-                        update_action_concurrency(action_config['actions'])
-                    if 'else' in action_config and 'actions' in action_config['else']:
-                        update_action_concurrency(action_config['else']['actions'])
-                    
-                    # Handle foreach loops specifically
-                    if action_config.get('type') == 'Foreach':
-                        if 'runtimeConfiguration' not in action_config:
-                            action_config['runtimeConfiguration'] = {}
-                        if 'concurrency' not in action_config['runtimeConfiguration']:
-                            action_config['runtimeConfiguration']['concurrency'] = {}
-                        action_config['runtimeConfiguration']['concurrency']['repetitions'] = max_runs
-                        logger.info(f"Updated foreach concurrency for {action_name} to {max_runs}")
-                        updated_actions += 1
-                        
-                        # Also update nested actions
-                        if 'actions' in action_config:
-                            update_action_concurrency(action_config['actions'])
-            
-            update_action_concurrency(actions)
-            
-            # Create the workflow update request
-            from azure.mgmt.logic.models import Workflow
-            
-            workflow_update = Workflow(
-                location=current_workflow.location,
-                definition=updated_definition,
-                state=current_workflow.state,
-                parameters=current_workflow.parameters,
-                tags=current_workflow.tags
-            )
-            
-            # Update the workflow
-            updated_workflow = logic_client.workflows.create_or_update(
-                resource_group_name=self.resource_group_name,
-                workflow_name=self.logic_app_name,
-                workflow=workflow_update
-            )
-            
-            logger.info(f"Successfully updated Logic App {self.logic_app_name} concurrency: trigger and {updated_actions} actions to {max_runs}")
-            
-            return {
-                "success": True,
-                "logic_app_name": self.logic_app_name,
-                "new_max_runs": max_runs,
-                "updated_triggers": len(triggers),
-                "updated_actions": updated_actions,
-                "updated_at": datetime.utcnow().isoformat()
-            }
+            return await self._submit_update(True, max_runs)
             
         except Exception as e:
             logger.error(f"Error updating Logic App action concurrency settings: {e}")
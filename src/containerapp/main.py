@@ -1,48 +1,106 @@
 """
 ARGUS Container App - Main FastAPI Application
 Reorganized modular structure for better maintainability
+
+The REST routes in API_ROUTES are mounted by the lifespan handler once
+api_routes has been imported, so the app only serves them when started with
+its lifespan (uvicorn does; use TestClient as a context manager in tests).
 """
+import asyncio
+import atexit
+import importlib
 import logging
 import os
+import queue
 from contextlib import asynccontextmanager
+from logging.handlers import QueueHandler, QueueListener
+from typing import TYPE_CHECKING
 
-from fastapi import FastAPI, Request, BackgroundTasks
+import orjson
+from fastapi import FastAPI, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from starlette.types import Receive, Scope, Send
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from dependencies import (
+    DEFAULT_MAX_RUNS, initialize_azure_clients, cleanup_azure_clients, resize_global_executor,
+    warm_up_azure_clients
+)
+
+if TYPE_CHECKING:
+    from mcp.server.streamable_http_manager import StreamableHTTPSessionManager
+
+
+def _configure_logging():
+    """Log through a queue so stream writes happen on a listener thread, not on the event loop"""
+    log_queue = queue.SimpleQueue()
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+    # The queue handler only merges the message arguments; the stream handler adds the layout
+    queue_handler = QueueHandler(log_queue)
+    queue_handler.setFormatter(logging.Formatter('%(message)s'))
+    logging.basicConfig(level=logging.INFO, handlers=[queue_handler])
+    listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    listener.start()
+    # Flush records still queued when the process exits
+    atexit.register(listener.stop)
 
-from dependencies import initialize_azure_clients, cleanup_azure_clients
-import api_routes
-from mcp_server import mcp_server
-from mcp.server.streamable_http_manager import StreamableHTTPSessionManager
 
 # Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+_configure_logging()
 logger = logging.getLogger(__name__)
 
 MAX_TIMEOUT = 45*60  # Set timeout duration in seconds
 
 # Create the StreamableHTTP session manager (created here so it's available for lifespan)
-mcp_session_manager: StreamableHTTPSessionManager | None = None
+mcp_session_manager: "StreamableHTTPSessionManager | None" = None
+
+
+class ORJSONResponse(JSONResponse):
+    """JSON response rendered with orjson straight to bytes"""
+    
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+
+
+def _import_handler_modules():
+    """Import the REST and MCP handler modules along with their OCR/OpenAI and MCP SDK dependencies"""
+    # The MCP SDK is only needed once the app starts serving, so it is kept out of `import main`
+    importlib.import_module("mcp.server.streamable_http_manager")
+    return importlib.import_module("api_routes"), importlib.import_module("mcp_server")
 
 
 @asynccontextmanager
-async def lifespan(_app: FastAPI):  # noqa: ARG001
-    """Initialize Azure clients and MCP session manager on startup"""
+async def lifespan(app: FastAPI):
+    """Initialize Azure clients, request handlers and MCP session manager on startup"""
     global mcp_session_manager  # noqa: PLW0603
     
     try:
-        await initialize_azure_clients()
+        # Install the shared thread pool as the loop's default executor first, so
+        # the import below does not create (and leak) the loop's own default pool
+        resize_global_executor(DEFAULT_MAX_RUNS)
+        # Import the handler modules in a worker thread so their import time
+        # overlaps with the network round trips of the Azure client setup
+        (api_routes, mcp_server_module), _ = await asyncio.gather(
+            asyncio.to_thread(_import_handler_modules),
+            initialize_azure_clients()
+        )
         logger.info("Successfully initialized Azure clients")
     except Exception as e:
         logger.error("Failed to initialize Azure clients: %s", e)
         raise
     
+    # Establish TLS connections during revision activation rather than on the first request
+    await warm_up_azure_clients()
+    
+    app.state.api_routes = api_routes
+    register_api_routes(app, api_routes)
+    
     # Initialize MCP session manager
+    from mcp.server.streamable_http_manager import StreamableHTTPSessionManager
     mcp_session_manager = StreamableHTTPSessionManager(
-        app=mcp_server,
+        app=mcp_server_module.mcp_server,
         event_store=None,  # No resumability - stateless mode
         json_response=True,  # Use JSON responses for better compatibility
         stateless=True,  # Stateless mode for scalability
@@ -58,14 +116,45 @@ async def lifespan(_app: FastAPI):  # noqa: ARG001
     logger.info("Application shutdown complete")
 
 
+class APIGZipMiddleware(GZipMiddleware):
+    """GZip responses of the /api/ endpoints only"""
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        # MCP streams must flush unbuffered and document files are already-compressed PDFs/images
+        path = scope.get("path", "")
+        if scope["type"] == "http" and path.startswith("/api/") and not path.endswith("/file"):
+            await super().__call__(scope, receive, send)
+        else:
+            await self.app(scope, receive, send)
+
+
+class MCPFastPath:
+    """Hand /mcp requests straight to the MCP session manager without walking the REST routes"""
+    
+    def __init__(self, app: ASGIApp):
+        self.app = app
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http":
+            path = scope["path"]
+            if path == "/mcp" or (path.startswith("/mcp/") and path != "/mcp/info"):
+                await handle_mcp_request(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
+
+
 # Initialize FastAPI app
 app = FastAPI(
     title="ARGUS Backend",
     description="Document processing backend using Azure AI services",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
+# Added first so it sits inside the CORS and GZip middleware
+app.add_middleware(MCPFastPath)
+
 # CORS middleware - Allow frontend origins
 # Get allowed origins from environment or use defaults
 cors_origins = os.getenv("CORS_ORIGINS", "").split(",")
@@ -77,180 +166,174 @@ default_origins = [
     "http://127.0.0.1:3000",
 ]
 
-# Add any dynamically configured origins
-all_origins = list(set(default_origins + cors_origins))
+# Restrict to the configured origins plus the local defaults when CORS_ORIGINS
+# is set; otherwise keep allowing all origins, which the deployed frontend relies on
+all_origins = tuple(dict.fromkeys(default_origins + cors_origins)) if cors_origins else ("*",)
 
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],  # Allow all origins
+    allow_origins=all_origins,
     allow_credentials=False,  # Must be False when using allow_origins=["*"]
     allow_methods=["GET", "POST", "PUT", "DELETE", "PATCH", "OPTIONS"],
     allow_headers=["*"],
     expose_headers=["Mcp-Session-Id"],  # Required for MCP Streamable HTTP transport
+    max_age=86400,  # Let browsers cache preflight responses for a day
 )
 
-
-# Health check endpoints
-@app.get("/")
-async def root():
-    return await api_routes.root()
-
-
-@app.get("/health")
-async def health_check():
-    return await api_routes.health_check()
-
-
-# Blob processing endpoints
-@app.post("/api/blob-created")
-async def handle_blob_created(request: Request, background_tasks: BackgroundTasks):
-    return await api_routes.handle_blob_created(request, background_tasks)
-
-
-@app.post("/api/process-blob")
-async def process_blob_manual(request: Request, background_tasks: BackgroundTasks):
-    return await api_routes.process_blob_manual(request, background_tasks)
-
-
-@app.post("/api/process-file")
-async def process_file(request: Request, background_tasks: BackgroundTasks):
-    return await api_routes.process_file(request, background_tasks)
-
-
-# Configuration management endpoints
-@app.get("/api/configuration")
-async def get_configuration():
-    return await api_routes.get_configuration()
-
-
-@app.post("/api/configuration")
-async def update_configuration(request: Request):
-    return await api_routes.update_configuration(request)
-
-
-@app.post("/api/configuration/refresh")
-async def refresh_configuration():
-    return await api_routes.refresh_configuration()
-
-
-# Logic App concurrency management endpoints
-@app.get("/api/concurrency")
-async def get_concurrency_settings():
-    return await api_routes.get_concurrency_settings()
-
-
-@app.put("/api/concurrency")
-async def update_concurrency_settings(request: Request):
-    return await api_routes.update_concurrency_settings(request)
-
-
-@app.get("/api/workflow-definition")
-async def get_workflow_definition():
-    return await api_routes.get_workflow_definition()
-
-
-@app.put("/api/concurrency-full")
-async def update_full_concurrency_settings(request: Request):
-    return await api_routes.update_full_concurrency_settings(request)
-
-
-@app.get("/api/concurrency/diagnostics")
-async def get_concurrency_diagnostics():
-    return await api_routes.get_concurrency_diagnostics()
-
-
-# OpenAI configuration management endpoints
-@app.get("/api/openai-settings")
-async def get_openai_settings():
-    return await api_routes.get_openai_settings()
-
-
-@app.put("/api/openai-settings")
-async def update_openai_settings(request: Request):
-    return await api_routes.update_openai_settings(request)
+# Document lists and extraction results are large, highly compressible JSON
+app.add_middleware(APIGZipMiddleware, minimum_size=1024, compresslevel=5)
 
 
-# Chat endpoint
-@app.post("/api/chat")
-async def chat_with_document(request: Request):
-    return await api_routes.chat_with_document(request)
-
-
-# MCP-powered chat endpoint with tool calling
-@app.post("/api/mcp-chat")
-async def mcp_chat(request: Request):
-    return await api_routes.mcp_chat(request)
-
-
-# Human-in-the-loop correction endpoints
-@app.patch("/api/documents/{document_id}/corrections")
-async def submit_correction(document_id: str, request: Request):
-    return await api_routes.submit_correction(document_id, request)
-
-
-@app.get("/api/documents/{document_id}/corrections")
-async def get_correction_history(document_id: str):
-    return await api_routes.get_correction_history(document_id)
-
-
-@app.get("/api/documents/{document_id}/file")
-async def get_document_file(document_id: str):
-    return await api_routes.get_document_file(document_id)
-
-
-# Document management endpoints
-@app.get("/api/documents")
-async def list_documents(dataset: str = None):
-    return await api_routes.list_documents(dataset)
-
-
-@app.get("/api/documents/{document_id}")
-async def get_document(document_id: str):
-    return await api_routes.get_document(document_id)
-
-
-@app.delete("/api/documents/{document_id}")
-async def delete_document(document_id: str):
-    return await api_routes.delete_document(document_id)
-
-
-@app.post("/api/documents/{document_id}/reprocess")
-async def reprocess_document(document_id: str, background_tasks: BackgroundTasks):
-    return await api_routes.reprocess_document(document_id, background_tasks)
-
-
-# Dataset management endpoints
-@app.get("/api/datasets")
-async def list_datasets():
-    return await api_routes.list_datasets()
-
+# REST endpoints: (path, HTTP method, api_routes handler name, route name).
+# Handlers are mounted directly once api_routes is imported during startup,
+# FastAPI injects their parameters
+API_ROUTES = (
+    # Health check endpoints
+    ("/", "GET", "root", "root"),
+    ("/ready", "GET", "health_check", "readiness_check"),
+    
+    # Blob processing endpoints
+    ("/api/blob-created", "POST", "handle_blob_created", "handle_blob_created"),
+    ("/api/process-blob", "POST", "process_blob_manual", "process_blob_manual"),
+    ("/api/process-file", "POST", "process_file", "process_file"),
+    
+    # Configuration management endpoints
+    ("/api/configuration", "GET", "get_configuration", "get_configuration"),
+    ("/api/configuration", "POST", "update_configuration", "update_configuration"),
+    ("/api/configuration/refresh", "POST", "refresh_configuration", "refresh_configuration"),
+    
+    # Logic App concurrency management endpoints
+    ("/api/concurrency", "GET", "get_concurrency_settings", "get_concurrency_settings"),
+    ("/api/concurrency", "PUT", "update_concurrency_settings", "update_concurrency_settings"),
+    ("/api/workflow-definition", "GET", "get_workflow_definition", "get_workflow_definition"),
+    ("/api/concurrency-full", "PUT", "update_full_concurrency_settings", "update_full_concurrency_settings"),
+    ("/api/concurrency/diagnostics", "GET", "get_concurrency_diagnostics", "get_concurrency_diagnostics"),
+    
+    # OpenAI configuration management endpoints
+    ("/api/openai-settings", "GET", "get_openai_settings", "get_openai_settings"),
+    ("/api/openai-settings", "PUT", "update_openai_settings", "update_openai_settings"),
+    
+    # Chat endpoint
+    ("/api/chat", "POST", "chat_with_document", "chat_with_document"),
+    
+    # MCP-powered chat endpoint with tool calling
+    ("/api/mcp-chat", "POST", "mcp_chat", "mcp_chat"),
+    
+    # Human-in-the-loop correction endpoints
+    ("/api/documents/{document_id}/corrections", "PATCH", "submit_correction", "submit_correction"),
+    ("/api/documents/{document_id}/corrections", "GET", "get_correction_history", "get_correction_history"),
+    ("/api/documents/{document_id}/file", "GET", "get_document_file", "get_document_file"),
+    
+    # Document management endpoints
+    ("/api/documents", "GET", "list_documents", "list_documents"),
+    ("/api/documents/{document_id}", "GET", "get_document", "get_document"),
+    ("/api/documents/{document_id}", "DELETE", "delete_document", "delete_document"),
+    ("/api/documents/{document_id}/reprocess", "POST", "reprocess_document", "reprocess_document"),
+    
+    # Dataset management endpoints
+    ("/api/datasets", "GET", "list_datasets", "list_datasets"),
+    ("/api/datasets", "POST", "create_dataset_endpoint", "create_dataset"),
+    ("/api/datasets/{dataset_name}/documents", "GET", "get_dataset_documents", "get_dataset_documents"),
+    ("/api/datasets/{dataset_name}/upload", "POST", "upload_file", "upload_file"),
+    ("/api/upload-url", "GET", "get_upload_url", "get_upload_url"),
+)
 
-@app.post("/api/datasets")
-async def create_dataset(request: Request):
-    """Create a new dataset configuration"""
-    return await api_routes.create_dataset_endpoint(request)
 
 
-@app.get("/api/datasets/{dataset_name}/documents")
-async def get_dataset_documents(dataset_name: str):
-    return await api_routes.get_dataset_documents(dataset_name)
+def register_api_routes(app: FastAPI, api_routes):
+    """
+    Mount the api_routes handlers listed in API_ROUTES on the app.
+    
+    Called from lifespan, so the REST routes (and their OpenAPI entries) only
+    exist once the app has started. Later lifespan runs in the same process,
+    such as repeated TestClient blocks, find them mounted already.
+    """
+    if getattr(app.state, "api_routes_registered", False):
+        return
+    for path, method, handler_name, name in API_ROUTES:
+        app.add_api_route(path, getattr(api_routes, handler_name), methods=[method], name=name)
+    app.state.api_routes_registered = True
+    # Rebuild the OpenAPI document if it was generated before the routes existed
+    app.openapi_schema = None
 
 
-@app.post("/api/datasets/{dataset_name}/upload")
-async def upload_file(dataset_name: str, request: Request, background_tasks: BackgroundTasks):
-    return await api_routes.upload_file(dataset_name, request, background_tasks)
+# Constant liveness body, kept as JSON because the frontends parse /health
+_HEALTH_BODY = b'{"status":"healthy"}'
 
 
-@app.get("/api/upload-url")
-async def get_upload_url(filename: str, dataset: str = "default-dataset"):
-    """Get a pre-signed SAS URL for direct blob upload"""
-    return await api_routes.get_upload_url(filename, dataset)
+@app.get("/health")
+async def health():
+    """
+    Liveness probe.
+    
+    Answers from the process alone so a slow Cosmos DB or Storage account
+    cannot get the container restarted; /ready checks the dependencies.
+    """
+    return Response(_HEALTH_BODY, media_type="application/json")
 
 
 # ============================================================================
 # MCP (Model Context Protocol) Endpoints - Streamable HTTP Transport
 # ============================================================================
 
+# Static part of the /mcp/info response, built once
+MCP_INFO = {
+    "name": "argus",
+    "description": "ARGUS Document Intelligence MCP Server",
+    "version": "1.0.0",
+    "transport": "streamable-http",
+    "endpoints": {
+        "mcp": "/mcp"
+    },
+    "tools": [
+        {
+            "name": "argus_list_documents",
+            "description": "List all processed documents"
+        },
+        {
+            "name": "argus_get_document", 
+            "description": "Get detailed document information"
+        },
+        {
+            "name": "argus_chat_with_document",
+            "description": "Ask questions about a document"
+        },
+        {
+            "name": "argus_list_datasets",
+            "description": "List available dataset configurations"
+        },
+        {
+            "name": "argus_get_dataset_config",
+            "description": "Get dataset configuration details"
+        },
+        {
+            "name": "argus_process_document_url",
+            "description": "Queue document for processing"
+        },
+        {
+            "name": "argus_get_extraction",
+            "description": "Get extracted data from document"
+        },
+        {
+            "name": "argus_search_documents",
+            "description": "Search documents by keyword"
+        },
+        {
+            "name": "argus_get_upload_url",
+            "description": "Get a pre-signed SAS URL for direct blob upload"
+        },
+        {
+            "name": "argus_create_dataset",
+            "description": "Create a new dataset configuration"
+        }
+    ]
+}
+
+# MCP_INFO serialized once without its closing brace, so each request only
+# encodes and appends the request-specific configuration example
+_MCP_INFO_PREFIX = orjson.dumps(MCP_INFO)[:-1] + b',"configuration_example":'
+
+
 @app.get("/mcp/info")
 async def mcp_info(request: Request):
     """
@@ -262,64 +345,17 @@ async def mcp_info(request: Request):
     base_url = str(request.base_url).rstrip('/')
     mcp_url = f"{base_url}/mcp"
     
-    return {
-        "name": "argus",
-        "description": "ARGUS Document Intelligence MCP Server",
-        "version": "1.0.0",
-        "transport": "streamable-http",
-        "endpoints": {
-            "mcp": "/mcp"
-        },
-        "tools": [
-            {
-                "name": "argus_list_documents",
-                "description": "List all processed documents"
-            },
-            {
-                "name": "argus_get_document", 
-                "description": "Get detailed document information"
-            },
-            {
-                "name": "argus_chat_with_document",
-                "description": "Ask questions about a document"
-            },
-            {
-                "name": "argus_list_datasets",
-                "description": "List available dataset configurations"
-            },
-            {
-                "name": "argus_get_dataset_config",
-                "description": "Get dataset configuration details"
-            },
-            {
-                "name": "argus_process_document_url",
-                "description": "Queue document for processing"
-            },
-            {
-                "name": "argus_get_extraction",
-                "description": "Get extracted data from document"
-            },
-            {
-                "name": "argus_search_documents",
-                "description": "Search documents by keyword"
-            },
-            {
-                "name": "argus_get_upload_url",
-                "description": "Get a pre-signed SAS URL for direct blob upload"
-            },
-            {
-                "name": "argus_create_dataset",
-                "description": "Create a new dataset configuration"
-            }
-        ],
-        "configuration_example": {
-            "mcpServers": {
-                "argus": {
-                    "url": mcp_url
-                }
+    configuration_example = {
+        "mcpServers": {
+            "argus": {
+                "url": mcp_url
             }
         }
     }
+    return Response(
+        _MCP_INFO_PREFIX + orjson.dumps(configuration_example) + b'}',
+        media_type="application/json"
+    )
 
 
 async def handle_mcp_request(scope: Scope, receive: Receive, send: Send) -> None:
@@ -330,7 +366,8 @@ async def handle_mcp_request(scope: Scope, receive: Receive, send: Send) -> None
 
 
 # Mount MCP at /mcp endpoint (supports GET, POST, DELETE)
-# Note: /mcp/info is defined above as a FastAPI route, which takes precedence
+# Note: /mcp/info is defined above as a FastAPI route, which takes precedence.
+# MCPFastPath serves these requests first; the mount keeps /mcp visible to the router
 app.mount("/mcp", handle_mcp_request)
 
 
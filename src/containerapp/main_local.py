@@ -3,18 +3,11 @@ Local development version of the ARGUS backend
 Works without Azure Cosmos DB by using in-memory storage
 """
 import logging
-import os
-import json
-import traceback
-import sys
 from datetime import datetime
-from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
-from typing import Dict, Any, List, Optional
-import asyncio
+from typing import Dict, Any, List
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI, Request, BackgroundTasks, HTTPException, UploadFile, File, Form
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, BackgroundTasks, HTTPException, UploadFile, File
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 import uvicorn
@@ -13,12 +13,10 @@ from mcp.types import (
     Tool,
     TextContent,
     EmbeddedResource,
-    INTERNAL_ERROR,
-    INVALID_PARAMS,
 )
 
 from dependencies import get_data_container, get_conf_container, get_blob_service_client
-from ai_ocr.process import connect_to_cosmos, fetch_model_prompt_and_schema
+from ai_ocr.process import connect_to_cosmos, fetch_model_prompt_and_schema, invalidate_model_config_cache
 from ai_ocr.azure.config import get_config
 from openai import AzureOpenAI
 
@@ -601,7 +599,12 @@ async def _handle_process_document_url(arguments: dict) -> list[TextContent]:
     
     try:
         # Import the processing function
-        from blob_processing import process_blob_event
+        from blob_processing import reserve_blob_event_slots, schedule_blob_events, validate_blob_url
+        
+        try:
+            validate_blob_url(blob_url)
+        except ValueError as e:
+            return [TextContent(type="text", text=f"Error: {e}")]
         
         # Create event data
         event_data = {
@@ -611,8 +614,9 @@ async def _handle_process_document_url(arguments: dict) -> list[TextContent]:
         
         # Queue for processing (this would normally be done via background tasks)
         # For MCP, we'll trigger it directly but note it's async
-        import asyncio
-        asyncio.create_task(process_blob_event(blob_url, event_data))
+        if not reserve_blob_event_slots(1):
+            return [TextContent(type="text", text="Error: Processing backlog full, retry later")]
+        schedule_blob_events([(blob_url, event_data)])
         
         result = {
             "status": "queued",
@@ -896,6 +900,7 @@ async def _handle_create_dataset(arguments: dict) -> list[TextContent]:
         
         # Upsert the configuration
         conf_container.upsert_item(body=config_item)
+        invalidate_model_config_cache()
         
         logger.info(f"Created dataset '{dataset_name}' via MCP")
         
@@ -1,36 +1,41 @@
 """
 Data models for the ARGUS Container App
 """
-from typing import Dict, Any
 
-
-class EventGridEvent:
-    """Event Grid event model"""
-    def __init__(self, event_data: Dict[str, Any]):
-        self.id = event_data.get('id')
-        self.event_type = event_data.get('eventType')
-        self.subject = event_data.get('subject')
-        self.event_time = event_data.get('eventTime')
-        self.data = event_data.get('data', {})
-        self.data_version = event_data.get('dataVersion')
-        self.metadata_version = event_data.get('metadataVersion')
+# Parallel ranged GETs (or staged block PUTs) used for blobs larger than a single request
+BLOB_TRANSFER_CONCURRENCY = 8
 
 
 class BlobInputStream:
     """Mock BlobInputStream to match the original function interface"""
     def __init__(self, blob_name: str, blob_size: int, blob_client):
         self.name = blob_name
-        self.length = blob_size
+        self._length = blob_size
         self._blob_client = blob_client
         self._content = None
     
+    @property
+    def length(self):
+        """Blob size in bytes, fetched from the blob properties only when it was not already known"""
+        if self._length is None:
+            self._length = self._blob_client.get_blob_properties().size
+        return self._length
+    
     def read(self, size: int = -1):
         """Read blob content"""
         if self._content is None:
-            blob_data = self._blob_client.download_blob()
+            blob_data = self._blob_client.download_blob(max_concurrency=BLOB_TRANSFER_CONCURRENCY)
             self._content = blob_data.readall()
         
         if size == -1:
             return self._content
         else:
             return self._content[:size]
+    
+    def readinto(self, stream):
+        """Download blob content straight into a writable stream without buffering it in memory"""
+        if self._content is not None:
+            stream.write(self._content)
+            return len(self._content)
+        downloader = self._blob_client.download_blob(max_concurrency=BLOB_TRANSFER_CONCURRENCY)
+        return downloader.readinto(stream)
@@ -0,0 +1,90 @@
+import asyncio
+import os
+import sys
+
+import pytest
+from fastapi import BackgroundTasks, HTTPException
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import api_routes  # noqa: E402
+import blob_processing  # noqa: E402
+import dependencies  # noqa: E402
+
+
+ACCOUNT_HOST = "myaccount.blob.core.windows.net"
+EXTRA_HOST = "otheraccount.blob.core.windows.net"
+
+
+class FakeServiceClient:
+    def __init__(self, account_url, **kwargs):
+        self.account_url = account_url
+        self.primary_hostname = account_url.split("://", 1)[1]
+        self.kwargs = kwargs
+
+    def get_blob_client(self, container, blob):
+        return (self.primary_hostname, container, blob)
+
+
+@pytest.fixture
+def created_clients(monkeypatch):
+    created = []
+
+    def record(account_url, **kwargs):
+        client = FakeServiceClient(account_url, **kwargs)
+        created.append(client)
+        return client
+
+    monkeypatch.setattr(dependencies, "BlobServiceClient", record)
+    monkeypatch.setattr(dependencies, "blob_service_client", FakeServiceClient(f"https://{ACCOUNT_HOST}"))
+    monkeypatch.setattr(dependencies, "ALLOWED_BLOB_HOSTS", frozenset({EXTRA_HOST}))
+    dependencies._get_account_blob_service_client.cache_clear()
+    yield created
+    dependencies._get_account_blob_service_client.cache_clear()
+
+
+def test_configured_account_uses_main_client_and_strips_sas(created_clients):
+    stream = blob_processing.create_blob_input_stream(
+        "https://MyAccount.blob.core.windows.net/datasets/invoices/a.pdf?sv=2024&sig=secret", 10
+    )
+    assert stream.name == "invoices/a.pdf"
+    assert stream._blob_client == (ACCOUNT_HOST, "datasets", "invoices/a.pdf")
+    assert created_clients == []
+
+
+def test_allowed_extra_account_client_is_created_once(created_clients):
+    for _ in range(2):
+        blob_processing.validate_blob_url(f"https://{EXTRA_HOST}/datasets/a.pdf")
+    assert [client.account_url for client in created_clients] == [f"https://{EXTRA_HOST}"]
+    assert created_clients[0].kwargs["credential"] is dependencies.credential
+    assert dependencies._get_account_blob_service_client.cache_info().maxsize == 8
+
+
+@pytest.mark.parametrize(
+    "blob_url",
+    [
+        "https://evil.example.com/datasets/a.pdf",
+        f"https://{ACCOUNT_HOST}@evil.example.com:443/datasets/a.pdf",
+        f"https://user@evil.example.com/datasets/a.pdf?host={ACCOUNT_HOST}",
+        f"http://{ACCOUNT_HOST}/datasets/a.pdf",
+        f"https://{ACCOUNT_HOST}/datasets",
+        "not a url",
+    ],
+)
+def test_foreign_or_malformed_urls_are_rejected_without_a_client(created_clients, blob_url):
+    with pytest.raises(ValueError):
+        blob_processing.create_blob_input_stream(blob_url)
+    assert created_clients == []
+
+
+def test_process_blob_manual_answers_400_for_foreign_host(created_clients):
+    class FakeRequest:
+        async def body(self):
+            return b'{"blob_url": "https://evil.example.com/datasets/a.pdf"}'
+
+    background_tasks = BackgroundTasks()
+    with pytest.raises(HTTPException) as excinfo:
+        asyncio.run(api_routes.process_blob_manual(FakeRequest(), background_tasks))
+    assert excinfo.value.status_code == 400
+    assert background_tasks.tasks == []
+    assert created_clients == []
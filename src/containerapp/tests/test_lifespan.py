@@ -0,0 +1,37 @@
+import asyncio
+import os
+import sys
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import main  # noqa: E402
+
+
+async def _noop():
+    return None
+
+
+def test_api_routes_registered_once_across_lifespan_cycles(monkeypatch):
+    monkeypatch.setattr(main, "initialize_azure_clients", _noop)
+    monkeypatch.setattr(main, "warm_up_azure_clients", _noop)
+    monkeypatch.setattr(main, "cleanup_azure_clients", _noop)
+
+    async def run_lifespan():
+        async with main.lifespan(main.app):
+            pass
+
+    for _ in range(2):
+        asyncio.run(run_lifespan())
+
+    api_routes = Counter(
+        (route.path, method)
+        for route in main.app.router.routes
+        if route.path.startswith("/api/")
+        for method in getattr(route, "methods", ())
+    )
+    expected = Counter((path, method) for path, method, _, _ in main.API_ROUTES if path.startswith("/api/"))
+    assert api_routes == expected
+    assert set(api_routes.values()) == {1}
+    paths = main.app.openapi()["paths"]
+    assert "/api/blob-created" in paths
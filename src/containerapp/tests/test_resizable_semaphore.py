@@ -0,0 +1,112 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from dependencies import ResizableSemaphore  # noqa: E402
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_acquire_release_within_limit():
+    async def scenario():
+        semaphore = ResizableSemaphore(2)
+        await semaphore.acquire()
+        await semaphore.acquire()
+        assert semaphore.locked()
+        semaphore.release()
+        assert not semaphore.locked()
+        semaphore.release()
+
+    run(scenario())
+
+
+def test_release_too_many_times_raises():
+    semaphore = ResizableSemaphore(1)
+    with pytest.raises(ValueError):
+        semaphore.release()
+
+
+def test_waiters_are_granted_in_fifo_order():
+    async def scenario():
+        semaphore = ResizableSemaphore(1)
+        order = []
+        await semaphore.acquire()
+
+        async def worker(name):
+            async with semaphore:
+                order.append(name)
+
+        tasks = [asyncio.create_task(worker(name)) for name in ("a", "b", "c")]
+        await asyncio.sleep(0)
+        semaphore.release()
+        await asyncio.gather(*tasks)
+        assert order == ["a", "b", "c"]
+
+    run(scenario())
+
+
+def test_resize_up_wakes_waiters_and_resize_down_blocks_new_acquirers():
+    async def scenario():
+        semaphore = ResizableSemaphore(1)
+        await semaphore.acquire()
+        waiter = asyncio.create_task(semaphore.acquire())
+        await asyncio.sleep(0)
+        assert not waiter.done()
+
+        semaphore.resize(2)
+        await asyncio.wait_for(waiter, 1)
+
+        semaphore.resize(1)
+        semaphore.release()
+        assert semaphore.locked()
+        semaphore.release()
+        assert not semaphore.locked()
+
+    run(scenario())
+
+
+def test_cancel_then_release_does_not_lose_cancellation():
+    async def scenario():
+        semaphore = ResizableSemaphore(1)
+        await semaphore.acquire()
+        waiter = asyncio.create_task(semaphore.acquire())
+        await asyncio.sleep(0)
+
+        # Cancel, then release before the waiter's cancellation handler runs;
+        # _wake_waiters pops and skips the cancelled future
+        waiter.cancel()
+        semaphore.release()
+
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert not semaphore.locked()
+        await asyncio.wait_for(semaphore.acquire(), 1)
+
+    run(scenario())
+
+
+def test_permit_granted_then_cancelled_is_handed_on():
+    async def scenario():
+        semaphore = ResizableSemaphore(1)
+        await semaphore.acquire()
+        first = asyncio.create_task(semaphore.acquire())
+        second = asyncio.create_task(semaphore.acquire())
+        await asyncio.sleep(0)
+
+        # Grant the permit to the first waiter, then cancel it before it resumes
+        semaphore.release()
+        first.cancel()
+
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        assert await asyncio.wait_for(second, 1) is True
+        semaphore.release()
+        assert not semaphore.locked()
+
+    run(scenario())